@@ -0,0 +1,58 @@
+import argparse
+import json
+import os
+import sys
+
+from api import local
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m api", description="Run a VibeSec scan over a local checkout.")
+    parser.add_argument("path", nargs="?", default=".", help="directory to scan (default: current directory)")
+    parser.add_argument("--repo-name", help="name shown in the report (default: directory name)")
+    parser.add_argument("--output", default="SECURITY_REPORT.md", help="report file to write, '-' for stdout")
+    parser.add_argument("--sarif", help="also write SARIF 2.1 for all findings to this path")
+    parser.add_argument("--results-json", help="also write compact JSON for all findings to this path")
+    parser.add_argument("--json", action="store_true", help="print raw findings and coverage as JSON")
+    parser.add_argument("--offline", action="store_true", help="skip the OSV dependency lookup")
+    parser.add_argument("--max-files", type=int, help="file budget (default: unlimited)")
+    parser.add_argument("--max-bytes", type=int, help="byte budget (default: unlimited)")
+    parser.add_argument("--write-baseline", action="store_true", help="accept all current findings into .vibesec-baseline")
+    parser.add_argument("--fail-on-findings", action="store_true", help="exit 1 when any finding is reported")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.path):
+        parser.error(f"{args.path} is not a directory")
+    result = local.scan(
+        args.path,
+        repo_name=args.repo_name,
+        offline=args.offline,
+        max_files=args.max_files,
+        max_bytes=args.max_bytes,
+        write_baseline=args.write_baseline,
+    )
+    if args.output == "-":
+        sys.stdout.write(result["report"] + "\n")
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(result["report"])
+    for path, key in ((args.sarif, "sarif"), (args.results_json, "results_json")):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(result[key])
+    if args.json:
+        json.dump(
+            {"raw_findings": result["raw_findings"], "coverage": result["coverage"], "suppression": result["suppression"]},
+            sys.stdout,
+            indent=2,
+        )
+        sys.stdout.write("\n")
+    elif args.output != "-":
+        print(f"{len(result['raw_findings'])} finding(s); report written to {args.output}", file=sys.stderr)
+    if args.fail_on_findings and result["raw_findings"]:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
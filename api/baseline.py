@@ -0,0 +1,84 @@
+import hashlib
+import secrets as _secrets
+
+BASELINE_FILE = ".vibesec-baseline"
+HEADER = "# vibesec-baseline v1"
+FINGERPRINT_BYTES = 16
+
+
+def _pattern(finding: dict) -> str:
+    scanner = finding.get("scanner", "")
+    if scanner == "env":
+        return finding.get("issue", "")
+    if scanner == "dependencies":
+        return f"{finding.get('package', '')}@{finding.get('version', '')}:{finding.get('cve_id', '')}"
+    return finding.get("pattern_name", "")
+
+
+def fingerprint(finding: dict, salt: bytes) -> bytes:
+    # Line numbers are left out on purpose so an accepted finding survives unrelated edits above it.
+    evidence = hashlib.sha256(str(finding.get("evidence", "")).encode("utf-8")).digest()
+    parts = [finding.get("scanner", ""), finding.get("path", ""), _pattern(finding)]
+    h = hashlib.sha256(salt)
+    h.update("\0".join(parts).encode("utf-8"))
+    h.update(evidence)
+    return h.digest()[:FINGERPRINT_BYTES]
+
+
+def parse(content: str) -> tuple[bytes, frozenset[bytes]]:
+    salt = b""
+    prints = set()
+    for line in content.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#"):
+            if line.startswith("# salt="):
+                try:
+                    salt = bytes.fromhex(line[len("# salt="):].strip())
+                except ValueError:
+                    salt = b""
+            continue
+        try:
+            prints.add(bytes.fromhex(line.split()[0]))
+        except ValueError:
+            continue
+    return salt, frozenset(prints)
+
+
+def render(findings: list[dict], salt: bytes | None = None) -> str:
+    salt = salt or _secrets.token_bytes(16)
+    prints = sorted({fingerprint(f, salt).hex() for f in findings})
+    lines = [HEADER, f"# salt={salt.hex()}", f"# {len(prints)} accepted finding(s); regenerate with write_baseline."]
+    lines.extend(prints)
+    return "\n".join(lines) + "\n"
+
+
+def split(files: list[dict]) -> tuple[list[dict], str | None]:
+    content = None
+    rest = []
+    for f in files:
+        if f.get("path") == BASELINE_FILE:
+            content = f.get("content", "")
+        else:
+            rest.append(f)
+    return rest, content
+
+
+def apply(findings: list[dict], content: str | None) -> tuple[list[dict], dict]:
+    if not content:
+        return findings, {"baseline_entries": 0, "suppressed": 0, "by_scanner": {}}
+    salt, prints = parse(content)
+    kept = []
+    by_scanner = {}
+    for f in findings:
+        if fingerprint(f, salt) in prints:
+            scanner = f.get("scanner", "")
+            by_scanner[scanner] = by_scanner.get(scanner, 0) + 1
+        else:
+            kept.append(f)
+    return kept, {
+        "baseline_entries": len(prints),
+        "suppressed": len(findings) - len(kept),
+        "by_scanner": by_scanner,
+    }
@@ -0,0 +1,59 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Runs in a fresh interpreter each time so module caches never hide cold-start cost.
+_PROBE = """
+import json, os, sys, time
+t0 = time.perf_counter()
+import api.main
+t1 = time.perf_counter()
+from api import local
+local.scan(sys.argv[1], offline=True)
+t2 = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "first_scan_ms": (t2 - t1) * 1000,
+    "time_to_first_scan_ms": (t2 - t0) * 1000,
+    "openai_loaded": "openai" in sys.modules,
+}))
+"""
+
+
+def _probe(path: str) -> dict:
+    env = {**os.environ, "VIBESEC_TRIAGE": "rules", "VIBESEC_PREWARM": "0"}
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE, path],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=root,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m api.bench",
+        description="Measure cold import time of api.main and time to the first (offline) scan.",
+    )
+    parser.add_argument("path", nargs="?", default=".", help="directory to scan (default: current directory)")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    runs = [_probe(os.path.abspath(args.path)) for _ in range(max(args.runs, 1))]
+    result = {"runs": len(runs), "openai_loaded": any(r["openai_loaded"] for r in runs)}
+    for key in ("import_ms", "first_scan_ms", "time_to_first_scan_ms"):
+        values = [r[key] for r in runs]
+        result[key] = {"median": round(statistics.median(values), 1), "min": round(min(values), 1), "max": round(max(values), 1)}
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
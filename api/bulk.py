@@ -0,0 +1,76 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+DEFAULT_WORKERS = 4
+MAX_BULK_REPOS = 500
+
+
+class FairScheduler:
+    # Bounded worker pool that round-robins between tokens, so one caller's 300-repo org
+    # scan cannot starve another caller's 3-repo request.
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._queues = OrderedDict()
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def _start(self) -> None:
+        while len(self._threads) < self.workers:
+            t = threading.Thread(target=self._loop, name=f"bulk-{len(self._threads)}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, owner_key: str, fn, *args) -> Future:
+        fut = Future()
+        with self._cond:
+            self._start()
+            self._queues.setdefault(owner_key, deque()).append((fut, fn, args))
+            self._cond.notify()
+        return fut
+
+    def _next(self):
+        with self._cond:
+            while not self._queues:
+                self._cond.wait()
+            owner_key, queue = next(iter(self._queues.items()))
+            job = queue.popleft()
+            # Rotate: this owner goes to the back of the line (or leaves it when drained).
+            del self._queues[owner_key]
+            if queue:
+                self._queues[owner_key] = queue
+            return job
+
+    def _loop(self) -> None:
+        while True:
+            fut, fn, args = self._next()
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                fut.set_result(fn(*args))
+            except BaseException as e:
+                fut.set_exception(e)
+
+    def pending(self) -> dict[str, int]:
+        with self._cond:
+            return {k: len(q) for k, q in self._queues.items()}
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def scheduler() -> FairScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                workers = int(os.environ.get("VIBESEC_BULK_WORKERS", "") or DEFAULT_WORKERS)
+                _scheduler = FairScheduler(max(workers, 1))
+    return _scheduler
+
+
+def owner_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,375 @@
+import abc
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# Shared cache/state for every module that memoises network results.
+# VIBESEC_CACHE_URL picks the backend:
+#   memory://                 per-process (default)
+#   sqlite:///path/cache.db   shared by all workers on one host
+#   redis://host:6379/0       shared across replicas (any RESP server; `python -m api.resp_server`
+#                             runs a stand-in, `--check` exercises RedisCache against it)
+# All backends store JSON values with a TTL in seconds, evict least-recently-used entries
+# beyond max_entries (memory: also beyond max_bytes of stored JSON; Redis: the server's
+# maxmemory policy), and provide an atomic lock with expiry so get_or_set runs the loader
+# once per key across workers.
+
+logger = logging.getLogger(__name__)
+KEY_PREFIX = "vibesec:"
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+LOCK_TTL = 60.0
+LOCK_WAIT = 30.0
+LOCK_POLL = 0.05
+REDIS_TIMEOUT = 5.0
+REDIS_RETRY_AFTER = 5.0
+
+
+class Cache(abc.ABC):
+    # The cache only ever affects speed: backend errors are logged and treated as a miss,
+    # a no-op write, or (for locks) an unguarded run, never raised into a scan.
+    def get(self, key: str):
+        try:
+            raw = self._get(KEY_PREFIX + key)
+            return None if raw is None else json.loads(raw)
+        except Exception as e:
+            logger.warning("cache: get %s failed: %s", key, e)
+            return None
+
+    def set(self, key: str, value, ttl: float) -> None:
+        try:
+            self._set(KEY_PREFIX + key, json.dumps(value, separators=(",", ":")), ttl)
+        except Exception as e:
+            logger.warning("cache: set %s failed: %s", key, e)
+
+    def delete(self, key: str) -> None:
+        try:
+            self._delete(KEY_PREFIX + key)
+        except Exception as e:
+            logger.warning("cache: delete %s failed: %s", key, e)
+
+    def _try_acquire(self, name: str, token: str, ttl: float) -> bool | None:
+        try:
+            return self._acquire(name, token, ttl)
+        except Exception as e:
+            logger.warning("cache: lock %s failed: %s", name, e)
+            return None
+
+    @contextmanager
+    def lock(self, key: str, ttl: float = LOCK_TTL, wait: float = LOCK_WAIT):
+        name = KEY_PREFIX + "lock:" + key
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + wait
+        acquired = self._try_acquire(name, token, ttl)
+        while acquired is False and time.monotonic() < deadline:
+            time.sleep(LOCK_POLL)
+            acquired = self._try_acquire(name, token, ttl)
+        if acquired is None:
+            # Backend unreachable: run unguarded rather than block or fail the caller.
+            yield True
+            return
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                try:
+                    self._release(name, token)
+                except Exception as e:
+                    logger.warning("cache: unlock %s failed: %s", name, e)
+
+    def get_or_set(self, key: str, ttl: float, loader):
+        value = self.get(key)
+        if value is not None:
+            return value
+        # Single flight: whoever holds the lock loads; everyone else re-reads after it.
+        # On lock timeout the caller loads anyway rather than failing the request.
+        with self.lock(key):
+            value = self.get(key)
+            if value is not None:
+                return value
+            value = loader()
+            if value is not None:
+                self.set(key, value, ttl)
+            return value
+
+    @abc.abstractmethod
+    def _get(self, key: str) -> str | None:
+        ...
+
+    @abc.abstractmethod
+    def _set(self, key: str, value: str, ttl: float) -> None:
+        ...
+
+    @abc.abstractmethod
+    def _delete(self, key: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def _acquire(self, name: str, token: str, ttl: float) -> bool:
+        ...
+
+    @abc.abstractmethod
+    def _release(self, name: str, token: str) -> None:
+        ...
+
+
+class MemoryCache(Cache):
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._locks = {}
+        self._mu = threading.Lock()
+
+    def _get(self, key: str) -> str | None:
+        with self._mu:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                self._pop(key)
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def _pop(self, key: str) -> None:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def _set(self, key: str, value: str, ttl: float) -> None:
+        with self._mu:
+            self._pop(key)
+            # One huge value (e.g. a multi-MB lockfile blob) would flush everything else; skip it.
+            if len(value) > self.max_bytes // 8:
+                return
+            self._data[key] = (time.time() + ttl, value)
+            self._bytes += len(value)
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._pop(next(iter(self._data)))
+
+    def _delete(self, key: str) -> None:
+        with self._mu:
+            self._pop(key)
+
+    def _acquire(self, name: str, token: str, ttl: float) -> bool:
+        with self._mu:
+            held = self._locks.get(name)
+            if held and held[0] > time.time():
+                return False
+            self._locks[name] = (time.time() + ttl, token)
+            return True
+
+    def _release(self, name: str, token: str) -> None:
+        with self._mu:
+            held = self._locks.get(name)
+            if held and held[1] == token:
+                del self._locks[name]
+
+
+class SQLiteCache(Cache):
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT, expires REAL, used REAL)")
+        db.execute("CREATE INDEX IF NOT EXISTS kv_used ON kv (used)")
+        db.execute("CREATE TABLE IF NOT EXISTS locks (name TEXT PRIMARY KEY, token TEXT, expires REAL)")
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            self._local.db = db
+        return db
+
+    def _get(self, key: str) -> str | None:
+        db = self._db()
+        now = time.time()
+        row = db.execute("SELECT value, expires FROM kv WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] <= now:
+            db.execute("DELETE FROM kv WHERE key = ? AND expires <= ?", (key, now))
+            return None
+        db.execute("UPDATE kv SET used = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def _set(self, key: str, value: str, ttl: float) -> None:
+        db = self._db()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires, used) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now),
+            )
+            db.execute("DELETE FROM kv WHERE expires <= ?", (now,))
+            excess = db.execute("SELECT COUNT(*) FROM kv").fetchone()[0] - self.max_entries
+            if excess > 0:
+                db.execute(
+                    "DELETE FROM kv WHERE key IN (SELECT key FROM kv ORDER BY used LIMIT ?)",
+                    (excess,),
+                )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def _delete(self, key: str) -> None:
+        self._db().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def _acquire(self, name: str, token: str, ttl: float) -> bool:
+        db = self._db()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("DELETE FROM locks WHERE name = ? AND expires <= ?", (name, now))
+            cur = db.execute(
+                "INSERT OR IGNORE INTO locks (name, token, expires) VALUES (?, ?, ?)",
+                (name, token, now + ttl),
+            )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return cur.rowcount == 1
+
+    def _release(self, name: str, token: str) -> None:
+        self._db().execute("DELETE FROM locks WHERE name = ? AND token = ?", (name, token))
+
+
+_RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+
+class RedisCache(Cache):
+    # Minimal RESP2 client so any Redis-protocol server (Redis, Valkey, KeyDB, a test stand-in) works
+    # without adding a client library.
+    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0, password: str | None = None):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self._local = threading.local()
+        self._down_until = 0.0
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # After a failure, skip the server for a moment so an outage costs one timeout,
+            # not one per cache call.
+            if time.monotonic() < self._down_until:
+                raise ConnectionError("redis unavailable")
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=REDIS_TIMEOUT)
+            except OSError:
+                self._down_until = time.monotonic() + REDIS_RETRY_AFTER
+                raise
+            conn = (sock, sock.makefile("rb"))
+            self._local.conn = conn
+            try:
+                if self.password:
+                    self._command("AUTH", self.password)
+                if self.db:
+                    self._command("SELECT", str(self.db))
+            except RuntimeError:
+                self._local.conn = None
+                conn[1].close()
+                sock.close()
+                raise
+        return conn
+
+    def _read(self, f):
+        line = f.readline()
+        if not line:
+            raise ConnectionError("redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RuntimeError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            n = int(rest)
+            if n < 0:
+                return None
+            data = f.read(n + 2)[:-2]
+            return data.decode("utf-8")
+        if kind == b"*":
+            n = int(rest)
+            return None if n < 0 else [self._read(f) for _ in range(n)]
+        raise RuntimeError(f"unexpected RESP reply: {line[:40]!r}")
+
+    def _command(self, *args: str):
+        sock, f = self._conn()
+        parts = [f"*{len(args)}\r\n".encode()]
+        for a in args:
+            b = a.encode("utf-8")
+            parts.append(f"${len(b)}\r\n".encode() + b + b"\r\n")
+        try:
+            sock.sendall(b"".join(parts))
+            return self._read(f)
+        except (OSError, ConnectionError):
+            self._local.conn = None
+            f.close()
+            sock.close()
+            raise
+
+    def _get(self, key: str) -> str | None:
+        return self._command("GET", key)
+
+    def _set(self, key: str, value: str, ttl: float) -> None:
+        self._command("SET", key, value, "PX", str(max(int(ttl * 1000), 1)))
+
+    def _delete(self, key: str) -> None:
+        self._command("DEL", key)
+
+    def _acquire(self, name: str, token: str, ttl: float) -> bool:
+        return self._command("SET", name, token, "NX", "PX", str(max(int(ttl * 1000), 1))) == "OK"
+
+    def _release(self, name: str, token: str) -> None:
+        try:
+            self._command("EVAL", _RELEASE_SCRIPT, "1", name, token)
+        except RuntimeError:
+            # Servers without scripting: compare-then-delete; the lock TTL bounds any race.
+            if self._command("GET", name) == token:
+                self._command("DEL", name)
+
+
+def from_url(url: str) -> Cache:
+    u = urlparse(url or "memory://")
+    if u.scheme in ("", "memory"):
+        return MemoryCache(max_bytes=int(os.environ.get("VIBESEC_CACHE_MAX_BYTES", "") or DEFAULT_MAX_BYTES))
+    if u.scheme == "sqlite":
+        return SQLiteCache(u.path or os.path.join(os.environ.get("VIBESEC_STATE_DIR", "/tmp/vibesec"), "cache.db"))
+    if u.scheme == "redis":
+        db = int(u.path.lstrip("/") or 0)
+        return RedisCache(u.hostname or "localhost", u.port or 6379, db, u.password)
+    raise ValueError(f"Unsupported VIBESEC_CACHE_URL scheme: {u.scheme}")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Cache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = from_url(os.environ.get("VIBESEC_CACHE_URL", "memory://"))
+    return _cache
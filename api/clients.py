@@ -0,0 +1,117 @@
+import contextvars
+import importlib.util
+import threading
+from contextlib import contextmanager
+
+import httpx
+
+DEFAULT_TIMEOUT = 30.0
+LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60.0)
+HTTP2 = importlib.util.find_spec("h2") is not None
+
+_clients = {}
+_openai_clients = {}
+_lock = threading.Lock()
+_counter = contextvars.ContextVar("vibesec_call_counter", default=None)
+
+
+class CallCounter:
+    def __init__(self):
+        self.n = 0
+        self._lock = threading.Lock()
+
+    def add(self) -> None:
+        with self._lock:
+            self.n += 1
+
+
+def _count_request(request: httpx.Request) -> None:
+    counter = _counter.get()
+    if counter is not None:
+        counter.add()
+
+
+@contextmanager
+def count_calls():
+    # Counts requests made through the pooled clients by this job, including from worker
+    # threads that run functions wrapped with bind().
+    counter = CallCounter()
+    token = _counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _counter.reset(token)
+
+
+def bind(fn):
+    # Carries the caller's call counter into a ThreadPoolExecutor worker.
+    counter = _counter.get()
+
+    def run(*args, **kwargs):
+        token = _counter.set(counter)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _counter.reset(token)
+
+    return run
+
+
+def _http(name: str) -> httpx.Client:
+    client = _clients.get(name)
+    if client is not None and not client.is_closed:
+        return client
+    with _lock:
+        client = _clients.get(name)
+        if client is None or client.is_closed:
+            client = httpx.Client(
+                timeout=DEFAULT_TIMEOUT,
+                limits=LIMITS,
+                http2=HTTP2,
+                event_hooks={"request": [_count_request]},
+            )
+            _clients[name] = client
+        return client
+
+
+def github() -> httpx.Client:
+    return _http("github")
+
+
+def osv() -> httpx.Client:
+    return _http("osv")
+
+
+def openai(api_key: str):
+    client = _openai_clients.get(api_key)
+    if client is not None:
+        return client
+    # openai is the slowest import in the app; only pay for it when triage needs the LLM.
+    from openai import OpenAI
+
+    with _lock:
+        client = _openai_clients.get(api_key)
+        if client is None:
+            client = OpenAI(api_key=api_key, http_client=httpx.Client(limits=LIMITS, http2=HTTP2, timeout=120.0))
+            _openai_clients[api_key] = client
+        return client
+
+
+def prewarm(openai_key: str | None = None) -> None:
+    github()
+    osv()
+    from api.scanners import secrets
+
+    secrets._luts()
+    if openai_key:
+        openai(openai_key)
+
+
+def close_all() -> None:
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+        for client in _openai_clients.values():
+            client.close()
+        _openai_clients.clear()
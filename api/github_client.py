@@ -1,12 +1,70 @@
 import base64
+import hashlib
+import os
+import re
+import sys
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
 import httpx
 
+from api import cache
+from api import clients
+
 GITHUB_API = "https://api.github.com"
 HEADERS = {"Accept": "application/vnd.github.v3+json"}
+MAX_BLOB_SIZE = 100000
+REPORT_FILES = {
+    "security_report.md",
+    "security_report.sarif",
+    "security_report.json",
+    "security_report.incremental.md",
+}
+MAX_LOCKFILE_SIZE = 10000000
+LOCKFILE_NAMES = {"package-lock.json", "yarn.lock", "poetry.lock"}
+MAX_REPO_PAGES = 50
+REPO_PAGE_WORKERS = 8
+REPO_CACHE_TTL = 120.0
+BLOB_CACHE_TTL = 86400.0
+TREE_CACHE_TTL = 86400.0
+TREE_INDEX_DEPTH = 3
+_SHA = re.compile(r"^[0-9a-fA-F]{40}$")
+DEFAULT_MAX_FILES = 50
+DEFAULT_MAX_BYTES = 1500000
+# Lockfiles are parsed, not regex-scanned, so they get their own (larger) download budget.
+DEFAULT_MAX_LOCK_BYTES = 20000000
+
+_SECRET_NAMES = {
+    ".env", ".npmrc", ".pypirc", ".netrc", ".htpasswd", "credentials", "credentials.json",
+    "secrets.json", "secrets.yml", "secrets.yaml", "id_rsa", "id_dsa", "id_ecdsa", "id_ed25519",
+    "service-account.json", "firebase.json", "wp-config.php",
+}
+_MANIFEST_NAMES = {
+    ".gitignore", "requirements.txt", "package.json", "package-lock.json", "yarn.lock",
+    "poetry.lock", "pyproject.toml", "pipfile", "pipfile.lock", "go.mod", "gemfile", "gemfile.lock",
+    "cargo.toml", "composer.json", ".vibesec-baseline",
+}
+_CONFIG_NAMES = {
+    "config.py", "settings.py", "config.js", "config.ts", "docker-compose.yml", "docker-compose.yaml",
+    "dockerfile", "application.properties", "application.yml", "appsettings.json", "next.config.js",
+    "vercel.json", "netlify.toml", "supabase.ts", "firebase.ts", "firebase.js",
+}
+_SECRET_EXTS = {"pem", "key", "p12", "pfx", "env", "tfvars"}
+_CONFIG_EXTS = {"yml", "yaml", "toml", "ini", "cfg", "conf", "properties", "json", "tf", "sh", "bash"}
+_SOURCE_EXTS = {
+    "py", "js", "jsx", "ts", "tsx", "mjs", "cjs", "rb", "go", "java", "php", "rs", "cs", "kt",
+    "swift", "dart", "c", "cpp", "sql", "vue", "svelte",
+}
+_DOC_EXTS = {"md", "rst", "txt", "adoc", "csv", "lock"}
+_BINARY_EXTS = {
+    "png", "jpg", "jpeg", "gif", "ico", "webp", "bmp", "tiff", "mp3", "mp4", "mov", "wav", "avi",
+    "woff", "woff2", "ttf", "otf", "eot", "zip", "gz", "tgz", "bz2", "xz", "7z", "rar", "jar",
+    "pdf", "exe", "dll", "so", "dylib", "bin", "class", "pyc", "wasm", "psd", "sqlite", "db",
+}
+_LOW_RISK_DIRS = ("docs/", "doc/", "test/", "tests/", "__tests__/", "examples/", "fixtures/", "assets/", "static/", "public/")
 
 
 def exchange_code_for_token(code: str, client_id: str, client_secret: str) -> str:
-    r = httpx.post(
+    r = clients.github().post(
         "https://github.com/login/oauth/access_token",
         json={"client_id": client_id, "client_secret": client_secret, "code": code},
         headers={"Accept": "application/json"},
@@ -19,29 +77,65 @@ def exchange_code_for_token(code: str, client_id: str, client_secret: str) -> st
     return token
 
 
-def list_user_repos(token: str) -> list[str]:
+def _fetch_repo_page(client: httpx.Client, token: str, page: int, url: str = f"{GITHUB_API}/user/repos") -> httpx.Response:
+    r = client.get(
+        url,
+        headers={**HEADERS, "Authorization": f"token {token}"},
+        params={"sort": "updated", "per_page": 100, "page": page},
+    )
+    r.raise_for_status()
+    return r
+
+
+def _list_user_repos_uncached(token: str, url: str = f"{GITHUB_API}/user/repos", skip_archived: bool = False) -> list[str]:
+    client = clients.github()
+    first = _fetch_repo_page(client, token, 1, url)
+    batches = [first.json()]
+    last = first.links.get("last", {}).get("url")
+    last_page = 1
+    if last:
+        m = re.search(r"[?&]page=(\d+)", last)
+        last_page = min(int(m.group(1)), MAX_REPO_PAGES) if m else 1
+    if last_page > 1:
+        with ThreadPoolExecutor(max_workers=REPO_PAGE_WORKERS) as pool:
+            fetch = clients.bind(lambda p: _fetch_repo_page(client, token, p, url).json())
+            pages = pool.map(fetch, range(2, last_page + 1))
+            batches.extend(pages)
     repos = []
-    with httpx.Client(timeout=15.0) as client:
-        page = 1
-        while len(repos) < 200:
-            r = client.get(
-                f"{GITHUB_API}/user/repos",
-                headers={**HEADERS, "Authorization": f"token {token}"},
-                params={"sort": "updated", "per_page": 100, "page": page},
-            )
-            r.raise_for_status()
-            batch = r.json()
-            if not batch:
-                break
-            for repo in batch:
-                if repo.get("permissions", {}).get("push"):
-                    repos.append(repo["full_name"])
-            if len(batch) < 100:
-                break
-            page += 1
+    for batch in batches:
+        for repo in batch:
+            if skip_archived and repo.get("archived"):
+                continue
+            if repo.get("permissions", {}).get("push"):
+                repos.append(repo["full_name"])
     return repos
 
 
+def list_user_repos(token: str) -> list[str]:
+    # Single flight per token: a warm-up task and the picker's first request share one listing.
+    key = "repos:" + hashlib.sha256(token.encode("utf-8")).hexdigest()
+    return cache.get_cache().get_or_set(key, REPO_CACHE_TTL, lambda: _list_user_repos_uncached(token))
+
+
+def list_org_repos(org: str, token: str) -> list[str]:
+    # Org listings skip archived repos (they are read-only, so a report cannot be committed).
+    return _list_user_repos_uncached(token, f"{GITHUB_API}/orgs/{quote(org)}/repos", skip_archived=True)
+
+
+def search_user_repos(token: str, q: str = "", page: int = 1, per_page: int = 100) -> dict:
+    repos = list_user_repos(token)
+    q = q.strip().lower()
+    matches = [r for r in repos if q in r.lower()] if q else repos
+    start = (page - 1) * per_page
+    return {
+        "repos": matches[start : start + per_page],
+        "total": len(matches),
+        "page": page,
+        "per_page": per_page,
+        "has_more": start + per_page < len(matches),
+    }
+
+
 def _parse_repo(repo_full_name: str) -> tuple[str, str]:
     parts = repo_full_name.split("/", 1)
     if len(parts) != 2:
@@ -51,51 +145,419 @@ def _parse_repo(repo_full_name: str) -> tuple[str, str]:
 
 def _skip_path(path: str) -> bool:
     p = path.lower()
-    return "node_modules" in p or p.startswith(".git/") or p == ".git" or p == "security_report.md"
+    return "node_modules" in p or p.startswith(".git/") or p == ".git" or p in REPORT_FILES
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, "") or default)
+    except ValueError:
+        return default
+
+
+def _risk_score(path: str) -> int:
+    p = path.lower()
+    name = p.rsplit("/", 1)[-1]
+    ext = name.rsplit(".", 1)[-1] if "." in name else ""
+    if ext in _BINARY_EXTS:
+        return 0
+    if name in _SECRET_NAMES or name.startswith(".env") or ext in _SECRET_EXTS:
+        score = 100
+    elif name in _MANIFEST_NAMES:
+        score = 90
+    elif name in _CONFIG_NAMES:
+        score = 80
+    elif ext in _CONFIG_EXTS:
+        score = 60
+    elif ext in _SOURCE_EXTS:
+        score = 50
+    elif ext in _DOC_EXTS:
+        score = 10
+    else:
+        score = 30
+    if any(d in p for d in ("secret", "credential", "config", "auth")):
+        score += 5
+    if p.startswith(_LOW_RISK_DIRS) or any("/" + d in p for d in _LOW_RISK_DIRS):
+        score -= 15
+    return max(score, 1)
+
+
+def _select_blobs(
+    tree: list[dict], max_files: int, max_bytes: int, max_lock_bytes: int = sys.maxsize
+) -> tuple[list[dict], list[dict]]:
+    skipped = []
+    candidates = []
+    for t in tree:
+        if t.get("type") != "blob":
+            continue
+        path = t.get("path", "")
+        size = t.get("size", 0)
+        if _skip_path(path):
+            skipped.append({"path": path, "size": size, "reason": "excluded_path"})
+            continue
+        is_lockfile = path.rsplit("/", 1)[-1].lower() in LOCKFILE_NAMES
+        if size >= (MAX_LOCKFILE_SIZE if is_lockfile else MAX_BLOB_SIZE):
+            skipped.append({"path": path, "size": size, "reason": "too_large"})
+            continue
+        score = _risk_score(path)
+        if score == 0:
+            skipped.append({"path": path, "size": size, "reason": "binary_extension"})
+            continue
+        candidates.append((score, t))
+    candidates.sort(key=lambda c: (-c[0], c[1].get("size", 0), c[1].get("path", "")))
+    selected = []
+    used = 0
+    lock_used = 0
+    for score, t in candidates:
+        path = t.get("path", "")
+        size = t.get("size", 0)
+        if len(selected) >= max_files:
+            skipped.append({"path": path, "size": size, "reason": "request_budget", "score": score})
+            continue
+        # Lockfiles are parsed by the dependency scanner, not regex-scanned line by line,
+        # so they spend the separate lockfile byte budget instead of the scan byte budget.
+        is_lockfile = path.rsplit("/", 1)[-1].lower() in LOCKFILE_NAMES
+        if is_lockfile and lock_used + size > max_lock_bytes:
+            skipped.append({"path": path, "size": size, "reason": "lock_byte_budget", "score": score})
+            continue
+        if not is_lockfile and used + size > max_bytes:
+            skipped.append({"path": path, "size": size, "reason": "byte_budget", "score": score})
+            continue
+        selected.append(t)
+        if is_lockfile:
+            lock_used += size
+        else:
+            used += size
+    return selected, skipped
 
 
-def fetch_repo_files(repo_full_name: str, token: str) -> list[dict]:
+def _fetch_blob(client: httpx.Client, owner: str, repo: str, sha: str, headers: dict) -> tuple[str | None, str | None]:
+    # Blobs are content-addressed, so a cached decode is valid for as long as we keep it.
+    key = f"blob:{owner}/{repo}:{sha}"
+    shared = cache.get_cache()
+    cached = shared.get(key)
+    if cached is not None:
+        return cached["content"], cached["reason"]
+    content, reason = _download_blob(client, owner, repo, sha, headers)
+    shared.set(key, {"content": content, "reason": reason}, BLOB_CACHE_TTL)
+    return content, reason
+
+
+def _download_blob(client: httpx.Client, owner: str, repo: str, sha: str, headers: dict) -> tuple[str | None, str | None]:
+    r = client.get(f"{GITHUB_API}/repos/{owner}/{repo}/git/blobs/{sha}", headers=headers, timeout=60.0)
+    r.raise_for_status()
+    return _decode_content(r.json().get("content", ""))
+
+
+def _decode_content(raw: str) -> tuple[str | None, str | None]:
+    try:
+        content = base64.b64decode(raw).decode("utf-8", errors="replace")
+    except Exception:
+        return None, "decode_failed"
+    if "\x00" in content:
+        return None, "binary_content"
+    return content, None
+
+
+def check_repo_access(repo_full_name: str, token: str) -> None:
+    owner, repo = _parse_repo(repo_full_name)
+    r = clients.github().get(
+        f"{GITHUB_API}/repos/{owner}/{repo}",
+        headers={**HEADERS, "Authorization": f"token {token}"},
+    )
+    r.raise_for_status()
+
+
+def list_commits(repo_full_name: str, token: str, max_commits: int | None = None) -> list[dict]:
     owner, repo = _parse_repo(repo_full_name)
     headers = {**HEADERS, "Authorization": f"token {token}"}
-    with httpx.Client(timeout=30.0) as client:
-        r = client.get(f"{GITHUB_API}/repos/{owner}/{repo}", headers=headers)
-        r.raise_for_status()
-        default_branch = r.json()["default_branch"]
-        ref = client.get(
-            f"{GITHUB_API}/repos/{owner}/{repo}/git/ref/heads/{default_branch}",
-            headers=headers,
-        )
-        ref.raise_for_status()
-        tree_sha = ref.json()["object"]["sha"]
-        tree_r = client.get(
-            f"{GITHUB_API}/repos/{owner}/{repo}/git/trees/{tree_sha}",
-            params={"recursive": "1"},
+    commits = []
+    client = clients.github()
+    r = client.get(f"{GITHUB_API}/repos/{owner}/{repo}", headers=headers)
+    r.raise_for_status()
+    default_branch = r.json()["default_branch"]
+    page = 1
+    while max_commits is None or len(commits) < max_commits:
+        r = client.get(
+            f"{GITHUB_API}/repos/{owner}/{repo}/commits",
             headers=headers,
+            params={"sha": default_branch, "per_page": 100, "page": page},
         )
-        tree_r.raise_for_status()
-        tree = tree_r.json().get("tree", [])
-    blobs = [t for t in tree if t.get("type") == "blob" and not _skip_path(t.get("path", "")) and t.get("size", 0) < 100000][:50]
+        r.raise_for_status()
+        batch = r.json()
+        for c in batch:
+            commits.append({
+                "sha": c["sha"],
+                "tree": c["commit"]["tree"]["sha"],
+                "date": (c["commit"].get("committer") or {}).get("date"),
+            })
+        if len(batch) < 100:
+            break
+        page += 1
+    return commits[:max_commits] if max_commits else commits
+
+
+def fetch_tree_blobs(client: httpx.Client, repo_full_name: str, token: str, tree_sha: str) -> list[dict]:
+    owner, repo = _parse_repo(repo_full_name)
+    r = client.get(
+        f"{GITHUB_API}/repos/{owner}/{repo}/git/trees/{tree_sha}",
+        params={"recursive": "1"},
+        headers={**HEADERS, "Authorization": f"token {token}"},
+    )
+    r.raise_for_status()
+    return [t for t in r.json().get("tree", []) if t.get("type") == "blob"]
+
+
+def fetch_blob(client: httpx.Client, repo_full_name: str, token: str, sha: str) -> tuple[str | None, str | None]:
+    owner, repo = _parse_repo(repo_full_name)
+    return _fetch_blob(client, owner, repo, sha, {**HEADERS, "Authorization": f"token {token}"})
+
+
+def _resolve_ref(client: httpx.Client, owner: str, repo: str, ref: str | None, headers: dict) -> tuple[str, str | None]:
+    # Returns (commit sha, branch name or None for a bare sha). Always makes at least one call
+    # with the caller's token: the tree/blob cache keys carry no token, so this is the access check.
+    if ref and _SHA.match(ref):
+        sha = ref.lower()
+        r = client.get(f"{GITHUB_API}/repos/{owner}/{repo}/git/commits/{sha}", headers=headers)
+        r.raise_for_status()
+        cache.get_cache().set(f"commit:{owner}/{repo}:{sha}", r.json()["tree"]["sha"], TREE_CACHE_TTL)
+        return sha, None
+    branch = ref.removeprefix("refs/heads/") if ref else None
+    if not branch:
+        r = client.get(f"{GITHUB_API}/repos/{owner}/{repo}", headers=headers)
+        r.raise_for_status()
+        branch = r.json()["default_branch"]
+    r = client.get(f"{GITHUB_API}/repos/{owner}/{repo}/git/ref/heads/{quote(branch)}", headers=headers)
+    r.raise_for_status()
+    return r.json()["object"]["sha"], branch
+
+
+def _tree_key(owner: str, repo: str, sha: str) -> str:
+    return f"tree:{owner}/{repo}:{sha}"
+
+
+def _index_recursive(owner: str, repo: str, root_sha: str, entries: list[dict]) -> list[list]:
+    # A recursive listing names every subtree's sha; cache each shallow subtree's flattened
+    # blobs so later branches that share it never list it again.
+    listings = {"": []}
+    tree_shas = {"": root_sha}
+    for t in entries:
+        path = t.get("path", "")
+        if t.get("type") == "tree" and path.count("/") < TREE_INDEX_DEPTH:
+            tree_shas[path] = t["sha"]
+            continue
+        if t.get("type") != "blob":
+            continue
+        parts = path.split("/")
+        for i in range(0, min(len(parts), TREE_INDEX_DEPTH + 1)):
+            d = "/".join(parts[:i])
+            listings.setdefault(d, []).append(["/".join(parts[i:]), t["sha"], t.get("size", 0)])
+    shared = cache.get_cache()
+    for d, sha in tree_shas.items():
+        shared.set(_tree_key(owner, repo, sha), listings.get(d, []), TREE_CACHE_TTL)
+    return listings[""]
+
+
+def _get_tree(client: httpx.Client, owner: str, repo: str, sha: str, headers: dict, stats: dict) -> list[dict]:
+    r = client.get(f"{GITHUB_API}/repos/{owner}/{repo}/git/trees/{sha}", headers=headers)
+    r.raise_for_status()
+    stats["tree_calls"] += 1
+    return r.json().get("tree", [])
+
+
+def _flatten_entries(
+    client: httpx.Client, owner: str, repo: str, sha: str, entries: list[dict], headers: dict, stats: dict
+) -> list[list]:
     out = []
-    with httpx.Client(timeout=60.0) as client:
-        for b in blobs:
-            path = b.get("path", "")
+    for e in entries:
+        if e.get("type") == "blob":
+            out.append([e["path"], e["sha"], e.get("size", 0)])
+        elif e.get("type") == "tree":
+            for path, blob_sha, size in _flatten_tree(client, owner, repo, e["sha"], headers, stats):
+                out.append([f"{e['path']}/{path}", blob_sha, size])
+    cache.get_cache().set(_tree_key(owner, repo, sha), out, TREE_CACHE_TTL)
+    return out
+
+
+def _flatten_tree(client: httpx.Client, owner: str, repo: str, sha: str, headers: dict, stats: dict) -> list[list]:
+    hit = cache.get_cache().get(_tree_key(owner, repo, sha))
+    if hit is not None:
+        stats["trees_reused"] += 1
+        return hit
+    entries = _get_tree(client, owner, repo, sha, headers, stats)
+    return _flatten_entries(client, owner, repo, sha, entries, headers, stats)
+
+
+def _list_tree(client: httpx.Client, owner: str, repo: str, commit_sha: str, headers: dict, stats: dict) -> list[dict]:
+    shared = cache.get_cache()
+    tree_sha = shared.get(f"commit:{owner}/{repo}:{commit_sha}")
+    if tree_sha is None:
+        r = client.get(f"{GITHUB_API}/repos/{owner}/{repo}/git/commits/{commit_sha}", headers=headers)
+        r.raise_for_status()
+        tree_sha = r.json()["tree"]["sha"]
+        shared.set(f"commit:{owner}/{repo}:{commit_sha}", tree_sha, TREE_CACHE_TTL)
+    flat = shared.get(_tree_key(owner, repo, tree_sha))
+    if flat is not None:
+        stats["trees_reused"] += 1
+    else:
+        # Walking directory by directory only pays off when most first-level subtrees are
+        # cached (a branch of an already-scanned repo). Otherwise, e.g. after LRU eviction,
+        # one recursive call is far cheaper than one call per directory.
+        entries = _get_tree(client, owner, repo, tree_sha, headers, stats)
+        subtrees = [e["sha"] for e in entries if e.get("type") == "tree"]
+        cached = sum(1 for sha in subtrees if shared.get(_tree_key(owner, repo, sha)) is not None)
+        if cached * 2 < len(subtrees):
             r = client.get(
-                f"{GITHUB_API}/repos/{owner}/{repo}/git/blobs/{b['sha']}",
-                headers={**HEADERS, "Authorization": f"token {token}"},
+                f"{GITHUB_API}/repos/{owner}/{repo}/git/trees/{tree_sha}",
+                params={"recursive": "1"},
+                headers=headers,
             )
             r.raise_for_status()
-            raw = r.json().get("content", "")
-            try:
-                content = base64.b64decode(raw).decode("utf-8", errors="replace")
-            except Exception:
-                continue
-            if "\x00" in content:
-                continue
-            out.append({"path": path, "content": content})
-    return out
+            stats["tree_calls"] += 1
+            data = r.json()
+            # A truncated listing is incomplete; fall through to the per-directory walk.
+            if not data.get("truncated"):
+                flat = _index_recursive(owner, repo, tree_sha, data.get("tree", []))
+        if flat is None:
+            flat = _flatten_entries(client, owner, repo, tree_sha, entries, headers, stats)
+    return [{"type": "blob", "path": path, "sha": sha, "size": size} for path, sha, size in flat]
 
 
-def commit_file(repo_full_name: str, token: str, filename: str, content: str) -> None:
+def fetch_repo_files(
+    repo_full_name: str,
+    token: str,
+    max_files: int | None = None,
+    max_bytes: int | None = None,
+    ref: str | None = None,
+    max_lock_bytes: int | None = None,
+) -> tuple[list[dict], dict]:
+    if max_files is None:
+        max_files = _env_int("VIBESEC_SCAN_MAX_FILES", DEFAULT_MAX_FILES)
+    if max_bytes is None:
+        max_bytes = _env_int("VIBESEC_SCAN_MAX_BYTES", DEFAULT_MAX_BYTES)
+    if max_lock_bytes is None:
+        max_lock_bytes = _env_int("VIBESEC_SCAN_MAX_LOCK_BYTES", DEFAULT_MAX_LOCK_BYTES)
+    owner, repo = _parse_repo(repo_full_name)
+    headers = {**HEADERS, "Authorization": f"token {token}"}
+    client = clients.github()
+    commit_sha, branch = _resolve_ref(client, owner, repo, ref, headers)
+    stats = {"tree_calls": 0, "trees_reused": 0}
+    tree = _list_tree(client, owner, repo, commit_sha, headers, stats)
+    blobs, skipped = _select_blobs(tree, max_files, max_bytes, max_lock_bytes)
+    out = []
+    for b in blobs:
+        path = b.get("path", "")
+        content, reason = _fetch_blob(client, owner, repo, b["sha"], headers)
+        if content is None:
+            skipped.append({"path": path, "size": b.get("size", 0), "reason": reason})
+            continue
+        out.append({"path": path, "content": content, "sha": b["sha"]})
+    coverage = {
+        "ref": branch or commit_sha,
+        "commit": commit_sha,
+        "branch": branch,
+        "tree_blobs": len(tree),
+        "scanned_files": len(out),
+        "scanned_bytes": sum(len(f["content"]) for f in out),
+        "max_files": max_files,
+        "max_bytes": max_bytes,
+        "max_lock_bytes": max_lock_bytes,
+        "skipped": skipped,
+        **stats,
+    }
+    return out, coverage
+
+
+def compare_paths(repo_full_name: str, token: str, base: str, head: str) -> set[str]:
+    owner, repo = _parse_repo(repo_full_name)
+    r = clients.github().get(
+        f"{GITHUB_API}/repos/{owner}/{repo}/compare/{base}...{head}",
+        headers={**HEADERS, "Authorization": f"token {token}"},
+        timeout=30.0,
+    )
+    r.raise_for_status()
+    return {f["filename"] for f in r.json().get("files") or [] if f.get("status") != "removed"}
+
+
+def fetch_paths(
+    repo_full_name: str,
+    token: str,
+    paths: set[str],
+    ref: str,
+    max_files: int | None = None,
+    max_lock_bytes: int | None = None,
+) -> tuple[list[dict], dict]:
+    if max_files is None:
+        max_files = _env_int("VIBESEC_SCAN_MAX_FILES", DEFAULT_MAX_FILES)
+    if max_lock_bytes is None:
+        max_lock_bytes = _env_int("VIBESEC_SCAN_MAX_LOCK_BYTES", DEFAULT_MAX_LOCK_BYTES)
+    owner, repo = _parse_repo(repo_full_name)
+    headers = {**HEADERS, "Authorization": f"token {token}"}
+    skipped = []
+    candidates = []
+    for path in paths:
+        if _skip_path(path):
+            skipped.append({"path": path, "size": 0, "reason": "excluded_path"})
+        elif _risk_score(path) == 0:
+            skipped.append({"path": path, "size": 0, "reason": "binary_extension"})
+        else:
+            candidates.append(path)
+    candidates.sort(key=lambda p: (-_risk_score(p), p))
+    for path in candidates[max_files:]:
+        skipped.append({"path": path, "size": 0, "reason": "request_budget"})
+    out = []
+    lock_used = 0
+    client = clients.github()
+    for path in candidates[:max_files]:
+        r = client.get(
+            f"{GITHUB_API}/repos/{owner}/{repo}/contents/{quote(path)}",
+            headers=headers,
+            params={"ref": ref},
+        )
+        if r.status_code == 404:
+            skipped.append({"path": path, "size": 0, "reason": "not_found"})
+            continue
+        r.raise_for_status()
+        data = r.json()
+        if not isinstance(data, dict) or data.get("type") != "file":
+            skipped.append({"path": path, "size": 0, "reason": "not_a_file"})
+            continue
+        size = data.get("size", 0)
+        is_lockfile = path.rsplit("/", 1)[-1].lower() in LOCKFILE_NAMES
+        if size >= (MAX_LOCKFILE_SIZE if is_lockfile else MAX_BLOB_SIZE):
+            skipped.append({"path": path, "size": size, "reason": "too_large"})
+            continue
+        if is_lockfile and lock_used + size > max_lock_bytes:
+            skipped.append({"path": path, "size": size, "reason": "lock_byte_budget"})
+            continue
+        if data.get("content"):
+            content, reason = _decode_content(data["content"])
+        else:
+            # The contents API omits content above 1 MB (typical package-lock.json); the blob API does not.
+            content, reason = _fetch_blob(client, owner, repo, data["sha"], headers)
+        if content is None:
+            skipped.append({"path": path, "size": size, "reason": reason})
+            continue
+        if is_lockfile:
+            lock_used += size
+        out.append({"path": path, "content": content, "sha": data.get("sha")})
+    coverage = {
+        "tree_blobs": len(paths),
+        "scanned_files": len(out),
+        "scanned_bytes": sum(len(f["content"]) for f in out),
+        "max_files": max_files,
+        "max_bytes": None,
+        "max_lock_bytes": max_lock_bytes,
+        "skipped": skipped,
+    }
+    return out, coverage
+
+
+def commit_file(repo_full_name: str, token: str, filename: str, content: str, branch: str | None = None) -> None:
+    commit_files(repo_full_name, token, {filename: content}, branch=branch)
+
+
+def commit_files(repo_full_name: str, token: str, files: dict[str, str], branch: str | None = None) -> None:
     owner, repo = _parse_repo(repo_full_name)
     headers = {**HEADERS, "Authorization": f"token {token}"}
 
@@ -103,49 +565,53 @@ def commit_file(repo_full_name: str, token: str, filename: str, content: str) ->
         if not r.is_success:
             raise ValueError(f"{label} failed ({r.status_code}): {r.text[:400]}")
 
-    with httpx.Client(timeout=30.0) as client:
+    client = clients.github()
+    if not branch:
         repo_r = client.get(f"{GITHUB_API}/repos/{owner}/{repo}", headers=headers)
         _gh(repo_r, "GET repo")
-        default_branch = repo_r.json()["default_branch"]
+        branch = repo_r.json()["default_branch"]
 
-        ref_r = client.get(
-            f"{GITHUB_API}/repos/{owner}/{repo}/git/ref/heads/{default_branch}",
-            headers=headers,
-        )
-        if ref_r.status_code == 404:
-            raise ValueError(f"{owner}/{repo} has no commits yet. Push an initial commit before installing VibeSec.")
-        _gh(ref_r, "GET ref")
-        head_sha = ref_r.json()["object"]["sha"]
+    ref_r = client.get(
+        f"{GITHUB_API}/repos/{owner}/{repo}/git/ref/heads/{quote(branch)}",
+        headers=headers,
+    )
+    if ref_r.status_code == 404:
+        raise ValueError(f"{owner}/{repo} has no commits yet. Push an initial commit before installing VibeSec.")
+    _gh(ref_r, "GET ref")
+    head_sha = ref_r.json()["object"]["sha"]
 
-        commit_r = client.get(
-            f"{GITHUB_API}/repos/{owner}/{repo}/git/commits/{head_sha}",
-            headers=headers,
-        )
-        _gh(commit_r, f"GET commit")
-        base_tree = commit_r.json()["tree"]["sha"]
+    commit_r = client.get(
+        f"{GITHUB_API}/repos/{owner}/{repo}/git/commits/{head_sha}",
+        headers=headers,
+    )
+    _gh(commit_r, f"GET commit")
+    base_tree = commit_r.json()["tree"]["sha"]
 
-        tree_r = client.post(
-            f"{GITHUB_API}/repos/{owner}/{repo}/git/trees",
-            headers=headers,
-            json={
-                "base_tree": base_tree,
-                "tree": [{"path": filename, "mode": "100644", "type": "blob", "content": content}],
-            },
-        )
-        _gh(tree_r, f"POST trees (base={base_tree[:7]})")
-        new_tree_sha = tree_r.json()["sha"]
+    tree_r = client.post(
+        f"{GITHUB_API}/repos/{owner}/{repo}/git/trees",
+        headers=headers,
+        json={
+            "base_tree": base_tree,
+            "tree": [
+                {"path": filename, "mode": "100644", "type": "blob", "content": content}
+                for filename, content in files.items()
+            ],
+        },
+    )
+    _gh(tree_r, f"POST trees (base={base_tree[:7]})")
+    new_tree_sha = tree_r.json()["sha"]
 
-        new_commit_r = client.post(
-            f"{GITHUB_API}/repos/{owner}/{repo}/git/commits",
-            headers=headers,
-            json={"message": "VibeSec: security report", "tree": new_tree_sha, "parents": [head_sha]},
-        )
-        _gh(new_commit_r, "POST commit")
-        new_commit_sha = new_commit_r.json()["sha"]
+    new_commit_r = client.post(
+        f"{GITHUB_API}/repos/{owner}/{repo}/git/commits",
+        headers=headers,
+        json={"message": "VibeSec: security report", "tree": new_tree_sha, "parents": [head_sha]},
+    )
+    _gh(new_commit_r, "POST commit")
+    new_commit_sha = new_commit_r.json()["sha"]
 
-        patch_r = client.patch(
-            f"{GITHUB_API}/repos/{owner}/{repo}/git/refs/heads/{default_branch}",
-            headers=headers,
-            json={"sha": new_commit_sha},
-        )
-        _gh(patch_r, "PATCH ref")
+    patch_r = client.patch(
+        f"{GITHUB_API}/repos/{owner}/{repo}/git/refs/heads/{quote(branch)}",
+        headers=headers,
+        json={"sha": new_commit_sha},
+    )
+    _gh(patch_r, "PATCH ref")
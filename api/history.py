@@ -0,0 +1,170 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+
+from api import cache
+from api import clients
+from api import github_client
+from api.scanners import secrets
+
+logger = logging.getLogger(__name__)
+STATE_DIR = os.environ.get("VIBESEC_STATE_DIR", "/tmp/vibesec")
+CHECKPOINT_EVERY = 10
+# Held in the shared cache so every worker process sees it. A crashed worker's lock expires.
+HISTORY_LOCK_TTL = 6 * 3600.0
+
+
+def _checkpoint_path(repo_full_name: str) -> str:
+    return os.path.join(STATE_DIR, "history", repo_full_name.replace("/", "__") + ".json")
+
+
+def load_checkpoint(repo_full_name: str) -> dict | None:
+    try:
+        with open(_checkpoint_path(repo_full_name), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _save_checkpoint(state: dict) -> None:
+    path = _checkpoint_path(state["repo"])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    state["updated_at"] = time.time()
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def _new_state(repo_full_name: str, token: str, max_commits: int | None) -> dict:
+    # Oldest first, so the first commit that references a blob is the one that introduced it.
+    commits = list(reversed(github_client.list_commits(repo_full_name, token, max_commits)))
+    return {
+        "repo": repo_full_name,
+        "status": "running",
+        "max_commits": max_commits,
+        "commits": commits,
+        "next_index": 0,
+        "seen_blobs": [],
+        "finding_keys": [],
+        "scanned_blobs": 0,
+        "findings": [],
+        "error": None,
+        "started_at": time.time(),
+    }
+
+
+def token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def token_matches(state: dict, token: str) -> bool:
+    return bool(token) and hmac.compare_digest(state.get("token_hash", ""), token_hash(token))
+
+
+def _lock_key(repo_full_name: str) -> str:
+    return f"history:{repo_full_name}"
+
+
+def is_running(repo_full_name: str) -> bool:
+    with cache.get_cache().lock(_lock_key(repo_full_name), ttl=1.0, wait=0) as acquired:
+        return not acquired
+
+
+def run(repo_full_name: str, token: str, max_commits: int | None = None, restart: bool = False) -> dict:
+    with cache.get_cache().lock(_lock_key(repo_full_name), ttl=HISTORY_LOCK_TTL, wait=0) as acquired:
+        if not acquired:
+            raise ValueError(f"history scan already running for {repo_full_name}")
+        return _run(repo_full_name, token, max_commits, restart)
+
+
+def _run(repo_full_name: str, token: str, max_commits: int | None, restart: bool) -> dict:
+    state = None
+    seen = set()
+    reported = set()
+    try:
+        # Prove the caller can read the repo before touching (or rebinding) anyone's checkpoint.
+        github_client.check_repo_access(repo_full_name, token)
+        state = None if restart else load_checkpoint(repo_full_name)
+        if state is None or state.get("status") == "done" or state.get("max_commits") != max_commits:
+            state = _new_state(repo_full_name, token, max_commits)
+        state["status"] = "running"
+        state["error"] = None
+        # Only a hash is persisted; status reads must present the same token.
+        state["token_hash"] = token_hash(token)
+        seen = set(state["seen_blobs"])
+        # A secret that survives later edits lives in a new blob per revision; report it once,
+        # for the oldest commit it appears in.
+        reported = {tuple(k) for k in state.get("finding_keys") or []}
+        commits = state["commits"]
+        client = clients.github()
+        while state["next_index"] < len(commits):
+            commit = commits[state["next_index"]]
+            # Only fold a commit's blobs and findings into the state once it is fully
+            # scanned, so a resumed run never skips a half-processed commit.
+            pending = set()
+            pending_keys = set()
+            scanned = 0
+            commit_findings = []
+            for b in github_client.fetch_tree_blobs(client, repo_full_name, token, commit["tree"]):
+                sha = b.get("sha")
+                path = b.get("path", "")
+                if sha in seen or sha in pending:
+                    continue
+                pending.add(sha)
+                if (
+                    github_client._skip_path(path)
+                    or b.get("size", 0) >= github_client.MAX_BLOB_SIZE
+                    or github_client._risk_score(path) == 0
+                ):
+                    continue
+                content, _ = github_client.fetch_blob(client, repo_full_name, token, sha)
+                if content is None:
+                    continue
+                scanned += 1
+                for f in secrets.scan([{"path": path, "content": content}]):
+                    key = (path, f.get("pattern_name", ""), f.get("evidence", ""))
+                    if key in reported or key in pending_keys:
+                        continue
+                    pending_keys.add(key)
+                    f["blob_sha"] = sha
+                    f["commit"] = commit["sha"]
+                    f["commit_date"] = commit.get("date")
+                    commit_findings.append(f)
+            seen |= pending
+            reported |= pending_keys
+            state["scanned_blobs"] += scanned
+            state["findings"].extend(commit_findings)
+            state["next_index"] += 1
+            if state["next_index"] % CHECKPOINT_EVERY == 0:
+                state["seen_blobs"] = list(seen)
+                state["finding_keys"] = [list(k) for k in reported]
+                _save_checkpoint(state)
+        state["status"] = "done"
+    except Exception as e:
+        logger.exception("history: scan failed for %s", repo_full_name)
+        if state is None:
+            # Failed before a state was bound to this caller: leave any existing checkpoint alone.
+            raise ValueError(f"history scan could not start for {repo_full_name}: {type(e).__name__}")
+        state["status"] = "interrupted"
+        state["error"] = f"{type(e).__name__}: {str(e)[:280]}"
+    state["seen_blobs"] = list(seen)
+    state["finding_keys"] = [list(k) for k in reported]
+    _save_checkpoint(state)
+    return state
+
+
+def summary(state: dict) -> dict:
+    return {
+        "repo": state.get("repo"),
+        "status": state.get("status"),
+        "commits_total": len(state.get("commits") or []),
+        "commits_scanned": state.get("next_index", 0),
+        "distinct_blobs": len(state.get("seen_blobs") or []),
+        "scanned_blobs": state.get("scanned_blobs", 0),
+        "findings": state.get("findings") or [],
+        "error": state.get("error"),
+    }
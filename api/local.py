@@ -0,0 +1,107 @@
+import mmap
+import os
+import sys
+
+from api import baseline
+from api import github_client
+from api import prioritize
+from api import report
+from api.scanners import secrets, env_exposure, dependencies
+
+BINARY_SNIFF_BYTES = 8192
+
+
+def _walk(root: str):
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root).replace(os.sep, "/")
+        rel_dir = "" if rel_dir == "." else rel_dir + "/"
+        dirnames[:] = [d for d in dirnames if not github_client._skip_path(rel_dir + d + "/")]
+        for name in filenames:
+            full = os.path.join(dirpath, name)
+            if os.path.islink(full):
+                continue
+            try:
+                size = os.path.getsize(full)
+            except OSError:
+                continue
+            yield {"type": "blob", "path": rel_dir + name, "size": size, "full_path": full}
+
+
+def _read_mapped(full_path: str) -> tuple[str | None, str | None]:
+    try:
+        with open(full_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return "", None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                # Binary sniff on the mapping itself; only text files are ever decoded.
+                if mm.find(b"\x00", 0, BINARY_SNIFF_BYTES) != -1:
+                    return None, "binary_content"
+                return str(mm[:], "utf-8", errors="replace"), None
+    except (OSError, ValueError):
+        return None, "read_failed"
+
+
+def collect_files(root: str, max_files: int | None = None, max_bytes: int | None = None) -> tuple[list[dict], dict]:
+    tree = list(_walk(root))
+    selected, skipped = github_client._select_blobs(
+        tree,
+        max_files if max_files is not None else sys.maxsize,
+        max_bytes if max_bytes is not None else sys.maxsize,
+    )
+    out = []
+    for b in selected:
+        content, reason = _read_mapped(b["full_path"])
+        if content is None:
+            skipped.append({"path": b["path"], "size": b["size"], "reason": reason})
+            continue
+        out.append({"path": b["path"], "content": content})
+    coverage = {
+        "tree_blobs": len(tree),
+        "scanned_files": len(out),
+        "scanned_bytes": sum(len(f["content"]) for f in out),
+        "max_files": max_files,
+        "max_bytes": max_bytes,
+        "skipped": skipped,
+    }
+    return out, coverage
+
+
+def scan(
+    root: str,
+    repo_name: str | None = None,
+    offline: bool = False,
+    max_files: int | None = None,
+    max_bytes: int | None = None,
+    write_baseline: bool = False,
+) -> dict:
+    files, coverage = collect_files(root, max_files, max_bytes)
+    files, baseline_content = baseline.split(files)
+    raw = []
+    raw.extend(secrets.scan(files))
+    raw.extend(env_exposure.scan(files))
+    if not offline:
+        raw.extend(dependencies.scan(files))
+    if write_baseline:
+        salt, _ = baseline.parse(baseline_content or "")
+        with open(os.path.join(root, baseline.BASELINE_FILE), "w", encoding="utf-8") as f:
+            f.write(baseline.render(raw, salt))
+    raw, suppression = baseline.apply(raw, baseline_content)
+    prioritize_result = prioritize.run(raw)
+    outputs = report.render_all(
+        raw,
+        prioritize_result["findings"],
+        repo_name or os.path.basename(os.path.abspath(root)),
+        developer_summary=prioritize_result.get("developer_summary"),
+        analysis_meta=prioritize_result.get("analysis_meta"),
+        coverage=coverage,
+        suppression=suppression,
+    )
+    return {
+        "raw_findings": raw,
+        "suppression": suppression,
+        "prioritized": prioritize_result,
+        "coverage": coverage,
+        "report": outputs[report.MARKDOWN_FILE],
+        "sarif": outputs[report.SARIF_FILE],
+        "results_json": outputs[report.JSON_FILE],
+    }
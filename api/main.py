@@ -1,15 +1,39 @@
+import json
+import logging
 import os
+import threading
+import time
+from concurrent.futures import as_completed
+from contextlib import asynccontextmanager, nullcontext
 
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, HTMLResponse, PlainTextResponse, RedirectResponse, StreamingResponse
 from pydantic import BaseModel
 
+from api import baseline
+from api import bulk
+from api import clients
 from api import github_client
+from api import history
+from api import webhook
 from api import report
 from api import prioritize
+from api import profiling
 from api.scanners import secrets, env_exposure, dependencies
 
-app = FastAPI(title="VibeSec")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm pooled clients (and the lazy openai/numpy imports) after the port is bound,
+    # so a scaled-from-zero container answers health checks before paying for them.
+    if os.environ.get("VIBESEC_PREWARM", "1") != "0":
+        key = (os.environ.get("OPENAI_API_KEY") or "").strip().strip('"').strip("'")
+        threading.Thread(target=clients.prewarm, args=(key or None,), daemon=True).start()
+    yield
+    clients.close_all()
+
+
+app = FastAPI(title="VibeSec", lifespan=lifespan)
+logger = logging.getLogger(__name__)
 
 _DIR = os.path.dirname(__file__)
 
@@ -30,7 +54,7 @@ jobs:
         run: |
           curl --max-time 55 -X POST https://web-production-210eb.up.railway.app/scan \\
             -H "Content-Type: application/json" \\
-            -d '{"repo_full_name": "${{ github.repository }}", "github_token": "${{ secrets.GITHUB_TOKEN }}"}'
+            -d '{"repo_full_name": "${{ github.repository }}", "github_token": "${{ secrets.GITHUB_TOKEN }}", "ref": "${{ github.ref }}"}'
 """
 
 _DARK = """
@@ -53,6 +77,13 @@ _DARK = """
     margin-bottom: 1rem; appearance: none; cursor: pointer;
   }
   select:focus { outline: none; border-color: #58a6ff; }
+  input[type=search] {
+    width: 100%; padding: 0.75rem 1rem; background: #0d1117; color: #e6edf3;
+    border: 1px solid #30363d; border-radius: 8px; font-size: 0.95rem; margin-bottom: 0.6rem;
+  }
+  input[type=search]:focus { outline: none; border-color: #58a6ff; }
+  .more { background: none; border: none; color: #58a6ff; cursor: pointer; font-size: 0.85rem; margin-bottom: 1rem; }
+  .more[hidden] { display: none; }
   .btn {
     display: inline-block; width: 100%; padding: 0.85rem;
     background: #238636; color: #fff; border: none; border-radius: 8px;
@@ -71,7 +102,7 @@ _DARK = """
 """
 
 
-def _picker_page(token: str, options_html: str) -> str:
+def _picker_page(token: str) -> str:
     return f"""<!DOCTYPE html>
 <html lang="en"><head>
   <meta charset="UTF-8">
@@ -83,12 +114,50 @@ def _picker_page(token: str, options_html: str) -> str:
   <div class="card">
     <h1>🛡️ Vibe<span>Sec</span></h1>
     <p>Select a repository to protect. VibeSec will scan it on every push and commit a <code>SECURITY_REPORT.md</code> with fix instructions.</p>
-    <select id="repo">{options_html}</select>
-    <button class="btn" id="btn" onclick="install()">Install VibeSec</button>
+    <input type="search" id="q" placeholder="Search repositories" oninput="search()">
+    <select id="repo"><option value="">Loading repositories...</option></select>
+    <button class="more" id="more" onclick="loadRepos(false)" hidden>Load more</button>
+    <button class="btn" id="btn" onclick="install()" disabled>Install VibeSec</button>
     <div id="status"></div>
   </div>
   <script>
     const TOKEN = {repr(token)};
+    let page = 0, timer = null, seq = 0;
+    async function loadRepos(reset) {{
+      const select = document.getElementById('repo');
+      const q = document.getElementById('q').value;
+      const mine = ++seq;
+      page = reset ? 1 : page + 1;
+      try {{
+        const r = await fetch('/repos?page=' + page + '&q=' + encodeURIComponent(q), {{
+          headers: {{'Authorization': 'token ' + TOKEN}}
+        }});
+        const data = await r.json();
+        if (mine !== seq) return;
+        if (!r.ok) throw new Error(data.detail || 'Failed to list repositories');
+        if (reset) select.innerHTML = '';
+        for (const name of data.repos) {{
+          const opt = document.createElement('option');
+          opt.value = name;
+          opt.textContent = name;
+          select.appendChild(opt);
+        }}
+        if (!select.options.length) {{
+          select.innerHTML = '<option value="">' + (q ? 'No matching repositories' : 'No repositories found with push access.') + '</option>';
+        }}
+        document.getElementById('more').hidden = !data.has_more;
+        document.getElementById('btn').disabled = !select.value;
+      }} catch(e) {{
+        const status = document.getElementById('status');
+        status.className = 'error';
+        status.textContent = 'Error: ' + e.message;
+      }}
+    }}
+    function search() {{
+      clearTimeout(timer);
+      timer = setTimeout(() => loadRepos(true), 200);
+    }}
+    loadRepos(true);
     async function install() {{
       const repo = document.getElementById('repo').value;
       const btn = document.getElementById('btn');
@@ -152,20 +221,41 @@ def auth_login():
 
 
 @app.get("/auth/callback", response_class=HTMLResponse)
-def auth_callback(code: str = ""):
+def auth_callback(background_tasks: BackgroundTasks, code: str = ""):
     client_id = os.environ.get("GITHUB_CLIENT_ID", "")
     client_secret = os.environ.get("GITHUB_CLIENT_SECRET", "")
     if not code:
         return HTMLResponse(_error_page("No OAuth code received from GitHub."), status_code=400)
     try:
         token = github_client.exchange_code_for_token(code, client_id, client_secret)
-        repos = github_client.list_user_repos(token)
     except Exception as e:
         return HTMLResponse(_error_page(str(e)), status_code=400)
-    if not repos:
-        return HTMLResponse(_error_page("No repositories found with push access."), status_code=400)
-    options = "\n".join(f'<option value="{r}">{r}</option>' for r in repos)
-    return HTMLResponse(_picker_page(token, options))
+    # Render the picker right away; the repo list is warmed in the background and loaded by /repos.
+    background_tasks.add_task(_warm_repo_cache, token)
+    return HTMLResponse(_picker_page(token))
+
+
+def _warm_repo_cache(token: str) -> None:
+    try:
+        github_client.list_user_repos(token)
+    except Exception:
+        pass
+
+
+@app.get("/repos")
+def repos(request: Request, q: str = "", page: int = 1, per_page: int = 100):
+    token = request.headers.get("authorization", "").removeprefix("token ").strip()
+    if not token:
+        raise HTTPException(401, "Authorization: token ... header required")
+    if page < 1 or not 1 <= per_page <= 100:
+        raise HTTPException(400, "page must be >= 1 and per_page between 1 and 100")
+    try:
+        return github_client.search_user_repos(token, q, page, per_page)
+    except Exception as e:
+        err = str(e).lower()
+        if "401" in err or "unauthorized" in err:
+            raise HTTPException(401, "Invalid or expired GitHub token")
+        raise HTTPException(502, f"Failed to list repositories: {e}")
 
 
 class InstallRequest(BaseModel):
@@ -204,16 +294,107 @@ def scan_get():
 class ScanRequest(BaseModel):
     repo_full_name: str
     github_token: str
+    write_baseline: bool = False
+    ref: str | None = None
+    # Opt-in: commit the report to the scanned branch instead of the default branch. Off by
+    # default so pushes to feature branches do not gain a bot commit the developer must pull.
+    commit_to_ref: bool = False
+
+
+def _scan_and_commit(
+    repo_full_name: str,
+    token: str,
+    files: list[dict],
+    coverage: dict,
+    write_baseline: bool = False,
+    commit: bool = True,
+    incremental: bool = False,
+    branch: str | None = None,
+) -> dict:
+    files, baseline_content = baseline.split(files)
+    raw = []
+    raw.extend(secrets.scan(files))
+    raw.extend(env_exposure.scan(files))
+    raw.extend(dependencies.scan(files))
+    if write_baseline:
+        salt, _ = baseline.parse(baseline_content or "")
+        try:
+            github_client.commit_file(
+                repo_full_name,
+                token,
+                baseline.BASELINE_FILE,
+                baseline.render(raw, salt),
+                branch=branch,
+            )
+        except Exception as e:
+            raise ValueError(f"Failed to commit baseline: {e}")
+        return {"baseline_written": len(raw)}
+    raw, suppression = baseline.apply(raw, baseline_content)
+    prioritize_result = prioritize.run(raw)
+    if incremental:
+        # A partial scan gets its own artifact so the full-repo report stays intact.
+        outputs = {
+            report.INCREMENTAL_FILE: report.generate(
+                prioritize_result["findings"],
+                repo_full_name,
+                developer_summary=prioritize_result.get("developer_summary"),
+                analysis_meta=prioritize_result.get("analysis_meta"),
+                coverage=coverage,
+                suppression=suppression,
+            )
+        }
+    else:
+        outputs = report.render_all(
+            raw,
+            prioritize_result["findings"],
+            repo_full_name,
+            developer_summary=prioritize_result.get("developer_summary"),
+            analysis_meta=prioritize_result.get("analysis_meta"),
+            coverage=coverage,
+            suppression=suppression,
+        )
+    if not commit:
+        return {"report_committed": False, "raw_findings": len(raw), "suppression": suppression}
+    try:
+        # None commits to the default branch; the report's coverage section names the scanned ref.
+        github_client.commit_files(repo_full_name, token, outputs, branch=branch)
+    except Exception as e:
+        raise ValueError(f"Failed to commit report: {e}")
+    return {
+        "report_committed": True,
+        "report_files": sorted(outputs),
+        "raw_findings": len(raw),
+        "suppression": suppression,
+    }
 
 
 @app.post("/scan")
-def scan(request: ScanRequest):
+def scan(request: ScanRequest, http_request: Request):
     if not request.repo_full_name or "/" not in request.repo_full_name:
         raise HTTPException(400, "repo_full_name must be owner/repo")
     if not request.github_token:
         raise HTTPException(400, "github_token required")
+    profiled = profiling.requested(http_request.headers.get(profiling.PROFILE_HEADER))
+    ctx = profiling.profile(profiling.profile_id(request.repo_full_name, request.ref)) if profiled else nullcontext({})
+    error = None
+    with ctx as profile_info:
+        try:
+            result = _scan(request)
+        except HTTPException as e:
+            error = e
+    if error is not None:
+        # Failed scans are the ones most worth profiling; point the caller at the dump.
+        if profile_info.get("profile_id"):
+            error.headers = {**(error.headers or {}), profiling.PROFILE_ID_HEADER: profile_info["profile_id"]}
+        raise error
+    return {**result, **profile_info}
+
+
+def _scan(request: ScanRequest) -> dict:
     try:
-        files = github_client.fetch_repo_files(request.repo_full_name, request.github_token)
+        files, coverage = github_client.fetch_repo_files(
+            request.repo_full_name, request.github_token, ref=request.ref
+        )
     except Exception as e:
         err = str(e).lower()
         if "401" in err or "unauthorized" in err:
@@ -221,25 +402,218 @@ def scan(request: ScanRequest):
         if "404" in err or "not found" in err:
             raise HTTPException(404, "Repo not found or no access")
         raise HTTPException(400, str(e) or "Failed to fetch repo")
-    raw = []
-    raw.extend(secrets.scan(files))
-    raw.extend(env_exposure.scan(files))
-    raw.extend(dependencies.scan(files))
-    prioritize_result = prioritize.run(raw)
-    prioritized = prioritize_result["findings"]
-    report_content = report.generate(
-        prioritized,
-        request.repo_full_name,
-        developer_summary=prioritize_result.get("developer_summary"),
-        analysis_meta=prioritize_result.get("analysis_meta"),
-    )
     try:
-        github_client.commit_file(
+        result = _scan_and_commit(
             request.repo_full_name,
             request.github_token,
-            "SECURITY_REPORT.md",
-            report_content,
+            files,
+            coverage,
+            write_baseline=request.write_baseline,
+            branch=coverage.get("branch") if request.commit_to_ref else None,
         )
-    except Exception as e:
-        raise HTTPException(502, f"Failed to commit report: {e}")
-    return {"status": "ok", "report_committed": True}
+    except ValueError as e:
+        raise HTTPException(502, str(e))
+    return {"status": "ok", **result, "coverage": report.coverage_summary(coverage)}
+
+
+@app.get("/profiles/{profile_id}")
+def get_profile(profile_id: str, request: Request, format: str = "prof"):
+    if not profiling.admin_ok(request.headers.get(profiling.PROFILE_HEADER, "")):
+        raise HTTPException(401, "Admin profile token required")
+    path = profiling.path_for(profile_id)
+    if not path or not os.path.exists(path):
+        raise HTTPException(404, "Profile not found")
+    if format == "text":
+        return PlainTextResponse(profiling.text_summary(profile_id) or "")
+    return FileResponse(path, media_type="application/octet-stream", filename=profile_id + ".prof")
+
+
+class HistoryScanRequest(BaseModel):
+    repo_full_name: str
+    github_token: str
+    max_commits: int | None = None
+    restart: bool = False
+
+
+def _run_history(req: HistoryScanRequest) -> None:
+    try:
+        history.run(req.repo_full_name, req.github_token, req.max_commits, req.restart)
+    except ValueError:
+        pass
+
+
+@app.post("/scan/history", status_code=202)
+def scan_history(request: HistoryScanRequest, background_tasks: BackgroundTasks):
+    if not request.repo_full_name or "/" not in request.repo_full_name:
+        raise HTTPException(400, "repo_full_name must be owner/repo")
+    if not request.github_token:
+        raise HTTPException(400, "github_token required")
+    if request.max_commits is not None and request.max_commits < 1:
+        raise HTTPException(400, "max_commits must be positive")
+    if history.is_running(request.repo_full_name):
+        raise HTTPException(409, "History scan already running for this repo")
+    checkpoint = history.load_checkpoint(request.repo_full_name)
+    resuming = bool(checkpoint and checkpoint.get("status") != "done" and not request.restart)
+    background_tasks.add_task(_run_history, request)
+    return {
+        "status": "accepted",
+        "repo": request.repo_full_name,
+        "resuming": resuming,
+        "progress_url": f"/scan/history/{request.repo_full_name}",
+    }
+
+
+@app.get("/scan/history/{owner}/{repo}")
+def scan_history_status(owner: str, repo: str, request: Request):
+    state = history.load_checkpoint(f"{owner}/{repo}")
+    if state is None:
+        raise HTTPException(404, "No history scan for this repo")
+    token = request.headers.get("authorization", "").removeprefix("token ").strip()
+    if not history.token_matches(state, token):
+        raise HTTPException(401, "Send the GitHub token that started the scan as 'Authorization: token ...'")
+    out = history.summary(state)
+    if history.is_running(f"{owner}/{repo}"):
+        out["status"] = "running"
+    return out
+
+
+def _webhook_scan(
+    repo_full_name: str,
+    token: str,
+    ref: str,
+    paths: set[str],
+    before: str,
+    after: str,
+    truncated: bool,
+) -> None:
+    try:
+        if truncated and before.strip("0"):
+            paths = paths | github_client.compare_paths(repo_full_name, token, before, after)
+        if any(p.rsplit("/", 1)[-1].startswith(".env") for p in paths):
+            # env_exposure needs .gitignore to judge a changed .env file.
+            paths = paths | {".gitignore"}
+        files, coverage = github_client.fetch_paths(repo_full_name, token, paths, after)
+        if not files:
+            return
+        if baseline.BASELINE_FILE not in paths:
+            # Fetched only once there is something to scan, so it never makes a push "scannable".
+            extra, _ = github_client.fetch_paths(repo_full_name, token, {baseline.BASELINE_FILE}, after)
+            files.extend(extra)
+        branch = ref.removeprefix("refs/heads/")
+        coverage.update({"ref": branch, "commit": after, "branch": branch, "incremental": True})
+        _scan_and_commit(repo_full_name, token, files, coverage, incremental=True, branch=branch)
+    except Exception:
+        logger.exception("webhook: scan failed for %s@%s", repo_full_name, after[:7])
+
+
+@app.post("/webhook", status_code=202)
+async def github_webhook(request: Request, background_tasks: BackgroundTasks):
+    secret = os.environ.get("GITHUB_WEBHOOK_SECRET", "")
+    if not secret:
+        raise HTTPException(500, "GITHUB_WEBHOOK_SECRET not configured")
+    body = await request.body()
+    if not webhook.verify_signature(body, request.headers.get("x-hub-signature-256", ""), secret):
+        raise HTTPException(401, "Invalid webhook signature")
+    event = request.headers.get("x-github-event", "")
+    if event == "ping":
+        return {"status": "pong"}
+    if event != "push":
+        return {"status": "ignored", "reason": f"unsupported_event:{event}"}
+    try:
+        payload = json.loads(body)
+    except json.JSONDecodeError:
+        raise HTTPException(400, "Body must be JSON")
+    reason = webhook.skip_reason(payload)
+    if reason:
+        return {"status": "ignored", "reason": reason}
+    repo_full_name = (payload.get("repository") or {}).get("full_name", "")
+    token = os.environ.get("VIBESEC_WEBHOOK_TOKEN", "")
+    if not token:
+        raise HTTPException(500, "VIBESEC_WEBHOOK_TOKEN not configured")
+    paths, truncated = webhook.changed_paths(payload)
+    if not paths and not truncated:
+        return {"status": "ignored", "reason": "no_changed_paths"}
+    background_tasks.add_task(
+        _webhook_scan,
+        repo_full_name,
+        token,
+        payload["ref"],
+        paths,
+        payload.get("before", ""),
+        payload.get("after", ""),
+        truncated,
+    )
+    return {"status": "accepted", "repo": repo_full_name, "paths": len(paths), "truncated": truncated}
+
+
+class BulkScanRequest(BaseModel):
+    github_token: str
+    org: str | None = None
+    repos: list[str] = []
+    commit: bool = True
+
+
+def _bulk_job(repo_full_name: str, token: str, commit: bool) -> dict:
+    started = time.perf_counter()
+    out = {"repo": repo_full_name}
+    with clients.count_calls() as calls:
+        try:
+            files, coverage = github_client.fetch_repo_files(repo_full_name, token)
+            result = _scan_and_commit(repo_full_name, token, files, coverage, commit=commit)
+            out.update(
+                status="ok",
+                findings=result.get("raw_findings", 0),
+                report_committed=result.get("report_committed", False),
+                scanned_files=coverage.get("scanned_files"),
+            )
+        except Exception as e:
+            out.update(status="error", error=f"{type(e).__name__}: {str(e)[:280]}")
+    out["api_calls"] = calls.n
+    out["elapsed_ms"] = round((time.perf_counter() - started) * 1000)
+    return out
+
+
+@app.post("/scan/bulk")
+def scan_bulk(request: BulkScanRequest):
+    if not request.github_token:
+        raise HTTPException(400, "github_token required")
+    repos = list(dict.fromkeys(r for r in request.repos if r))
+    if request.org:
+        try:
+            repos.extend(r for r in github_client.list_org_repos(request.org, request.github_token) if r not in repos)
+        except Exception as e:
+            raise HTTPException(400, f"Failed to list org repos: {e}")
+    if not repos:
+        raise HTTPException(400, "Provide org or a non-empty repos list")
+    if any("/" not in r for r in repos):
+        raise HTTPException(400, "repos must be owner/repo")
+    if len(repos) > bulk.MAX_BULK_REPOS:
+        raise HTTPException(400, f"At most {bulk.MAX_BULK_REPOS} repos per bulk scan")
+
+    scheduler = bulk.scheduler()
+    key = bulk.owner_key(request.github_token)
+    started = time.perf_counter()
+    futures = [scheduler.submit(key, _bulk_job, r, request.github_token, request.commit) for r in repos]
+
+    def _progress():
+        yield json.dumps({"event": "queued", "repos": len(repos), "workers": scheduler.workers}) + "\n"
+        ok = failed = api_calls = 0
+        for i, fut in enumerate(as_completed(futures), 1):
+            result = fut.result()
+            ok += result["status"] == "ok"
+            failed += result["status"] != "ok"
+            api_calls += result["api_calls"]
+            yield json.dumps({"event": "repo", "done": i, "total": len(repos), **result}) + "\n"
+        elapsed = time.perf_counter() - started
+        yield json.dumps({
+            "event": "summary",
+            "repos": len(repos),
+            "ok": ok,
+            "failed": failed,
+            "elapsed_s": round(elapsed, 2),
+            "repos_per_min": round(len(repos) / elapsed * 60, 2) if elapsed else None,
+            "api_calls": api_calls,
+            "api_calls_per_repo": round(api_calls / len(repos), 2),
+        }) + "\n"
+
+    return StreamingResponse(_progress(), media_type="application/x-ndjson")
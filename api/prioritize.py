@@ -1,8 +1,11 @@
+import hashlib
 import json
 import logging
 import os
 import re
-from openai import OpenAI
+
+from api import cache
+from api import clients
 
 SYSTEM = """You are a senior application security engineer reviewing automated scanner findings for a solo developer's project.
 
@@ -46,6 +49,41 @@ _DEFAULT_MODEL_CANDIDATES = [
     "gpt-4o",
 ]
 
+TRIAGE_CACHE_TTL = 3600.0
+
+# Local triage: the LLM is only consulted when the rule ranking is ambiguous or the set is large.
+TOP_N = 5
+LARGE_FINDING_SET = 15
+AMBIGUITY_MARGIN = 5.0
+LOW_CONFIDENCE_SCORE = 40.0
+_PATTERN_CONFIDENCE = {
+    "AWS Access Key": 0.95,
+    "GitHub Token": 0.95,
+    "Stripe Secret Key": 0.95,
+    "OpenAI API Key": 0.9,
+    "Stripe Publishable Key": 0.3,
+    "Generic secret": 0.6,
+    "High Entropy String": 0.45,
+}
+_ISSUE_CONFIDENCE = {
+    "dotenv_not_gitignored": 0.9,
+    "dotenv_has_real_values": 0.85,
+    "dotenv_example_has_credentials": 0.7,
+}
+_CVE_CONFIDENCE = {"CRITICAL": 0.85, "HIGH": 0.65}
+_CATEGORY_WEIGHT = {
+    "Secrets Management": 1.0,
+    "Secrets in Configuration": 1.0,
+    "Vulnerable Dependencies": 0.9,
+}
+# Matched against whole path segments: "example" must halve examples/app.py, not .env.example.
+_LOW_RISK_DIRS = {
+    "test", "tests", "__tests__", "spec", "specs", "fixture", "fixtures", "example", "examples",
+    "sample", "samples", "mock", "mocks", "__mocks__", "docs", "doc",
+}
+_LOW_RISK_NAME_PARTS = {"test", "tests", "spec", "mock", "mocks", "fixture", "fixtures"}
+_CONFIG_EXTS = (".env", ".yml", ".yaml", ".json", ".toml", ".ini", ".cfg", ".conf", ".tf", ".tfvars", ".properties")
+
 
 def _load_owasp_mapping() -> dict:
     try:
@@ -100,20 +138,110 @@ def _default_enrich(f: dict, i: int) -> dict:
     return out
 
 
+def _risk_score(finding: dict, env_exposed: bool) -> float:
+    scanner = finding.get("scanner", "")
+    if scanner == "secrets":
+        confidence = _PATTERN_CONFIDENCE.get(finding.get("pattern_name", ""), 0.5)
+    elif scanner == "env":
+        confidence = _ISSUE_CONFIDENCE.get(finding.get("issue", ""), 0.6)
+    elif scanner == "dependencies":
+        confidence = _CVE_CONFIDENCE.get(str(finding.get("severity", "")).upper(), 0.5)
+    else:
+        confidence = 0.5
+    path = (finding.get("path") or "").lower()
+    name = path.rsplit("/", 1)[-1]
+    if _low_risk_path(path):
+        confidence *= 0.5
+    elif name.startswith(".env") or name.endswith(_CONFIG_EXTS):
+        confidence *= 1.1
+    if env_exposed and name.startswith(".env") and scanner in ("secrets", "env"):
+        confidence *= 1.2
+    weight = _CATEGORY_WEIGHT.get(_mapping_entry(finding).get("owasp_category", ""), 0.8)
+    return round(min(confidence * weight, 1.0) * 100, 1)
+
+
+def _low_risk_path(path: str) -> bool:
+    parts = path.split("/")
+    if any(d in _LOW_RISK_DIRS for d in parts[:-1]):
+        return True
+    return any(t in _LOW_RISK_NAME_PARTS for t in re.split(r"[._-]", parts[-1]))
+
+
+def _rank(raw_findings: list[dict]) -> list[tuple[float, int]]:
+    env_exposed = any(f.get("issue") == "dotenv_not_gitignored" for f in raw_findings)
+    scored = [(_risk_score(f, env_exposed), i) for i, f in enumerate(raw_findings)]
+    scored.sort(key=lambda x: (-x[0], raw_findings[x[1]].get("path", ""), x[1]))
+    return scored
+
+
+def _triage_mode() -> str:
+    return os.environ.get("VIBESEC_TRIAGE", "auto").strip().lower()
+
+
+def _llm_reason(ranked: list[tuple[float, int]]) -> str | None:
+    if _triage_mode() == "llm":
+        return "forced"
+    if len(ranked) > LARGE_FINDING_SET:
+        return "large_finding_set"
+    if ranked[0][0] < LOW_CONFIDENCE_SCORE:
+        return "low_confidence"
+    if len(ranked) > TOP_N and ranked[TOP_N - 1][0] - ranked[TOP_N][0] < AMBIGUITY_MARGIN:
+        return "ambiguous_cutoff"
+    return None
+
+
+def _rule_enrich(f: dict, i: int, score: float) -> dict:
+    out = _default_enrich(f, i)
+    out["risk_score"] = score
+    if out.get("standard_fix_requirements"):
+        out["fix_steps"] = list(out["standard_fix_requirements"])
+    where = f.get("path", "")
+    if f.get("line_no"):
+        where = f"{where}:{f['line_no']}"
+    scanner = f.get("scanner")
+    if scanner == "secrets":
+        out["risk_explanation"] = (
+            f"{f.get('pattern_name', 'A secret')} is committed in {where}; anyone with read access to the repo "
+            "or its history can use it until it is rotated."
+        )
+        out["verify"] = "Re-run the scan and confirm the value no longer appears; confirm the old credential is revoked."
+    elif scanner == "env":
+        out["risk_explanation"] = f"{f.get('detail', 'Environment file exposure')}; the values are readable by anyone with repo access."
+        out["verify"] = "Confirm .env is untracked (git ls-files .env is empty) and exposed values were rotated."
+    elif scanner == "dependencies":
+        out["risk_explanation"] = (
+            f"{f.get('package')} {f.get('version')} is affected by {f.get('cve_id')} "
+            f"({f.get('severity', 'HIGH')}): {f.get('summary', '')}".strip()
+        )
+        out["verify"] = "Re-run the dependency scan and confirm the CVE is no longer reported."
+    return out
+
+
+def _rules(raw_findings: list[dict], ranked: list[tuple[float, int]], reason: str) -> dict:
+    top = ranked[:TOP_N]
+    return {
+        "findings": [_rule_enrich(raw_findings[idx], i, score) for i, (score, idx) in enumerate(top)],
+        "developer_summary": None,
+        "analysis_meta": {
+            "path": "rules",
+            "reason": reason,
+            "model": None,
+            "raw_findings": len(raw_findings),
+            "mapped_findings": len(top),
+            "top_scores": [score for score, _ in top],
+        },
+    }
+
+
 def _fallback(
     raw_findings: list[dict],
     reason: str,
     model: str | None = None,
     reason_detail: str | None = None,
 ) -> dict:
-    order = {"secrets": 0, "env": 1, "dependencies": 2}
-    sorted_f = sorted(
-        raw_findings,
-        key=lambda x: (order.get(x.get("scanner", ""), 99), x.get("path", "")),
-    )
-    top5 = sorted_f[:5]
+    top5 = _rank(raw_findings)[:TOP_N]
     return {
-        "findings": [_default_enrich(f, i) for i, f in enumerate(top5)],
+        "findings": [_rule_enrich(raw_findings[idx], i, score) for i, (score, idx) in enumerate(top5)],
         "developer_summary": None,
         "analysis_meta": {
             "path": "fallback",
@@ -178,16 +306,37 @@ def run(raw_findings: list[dict]) -> dict:
                 "mapped_findings": 0,
             },
         }
+    ranked = _rank(raw_findings)
+    if _triage_mode() == "rules":
+        return _rules(raw_findings, ranked, reason="forced_rules")
+    llm_reason = _llm_reason(ranked)
+    if llm_reason is None:
+        return _rules(raw_findings, ranked, reason="unambiguous")
     key = os.environ.get("OPENAI_API_KEY")
     if not key:
         logger.warning("prioritize: OPENAI_API_KEY is missing; using fallback")
-        return _fallback(raw_findings, reason="missing_api_key", model=None)
+        return _fallback(raw_findings, reason="missing_api_key", model=None, reason_detail=llm_reason)
     configured_model = os.environ.get("OPENAI_MODEL", "").strip()
     candidates = [configured_model] if configured_model else list(_DEFAULT_MODEL_CANDIDATES)
     payload = json.dumps(raw_findings, indent=2)
+    # Identical finding sets (re-pushes, several workers) share one LLM triage.
+    cache_key = "triage:" + hashlib.sha256((",".join(candidates) + "\0" + payload).encode("utf-8")).hexdigest()
+    shared = cache.get_cache()
+    with shared.lock(cache_key, ttl=180.0, wait=120.0):
+        cached = shared.get(cache_key)
+        if cached is not None:
+            cached["analysis_meta"]["cached"] = True
+            return cached
+        result = _llm_triage(raw_findings, key, candidates, payload, llm_reason)
+        if result["analysis_meta"].get("path") == "openai":
+            shared.set(cache_key, result, TRIAGE_CACHE_TTL)
+        return result
+
+
+def _llm_triage(raw_findings: list[dict], key: str, candidates: list[str], payload: str, llm_reason: str) -> dict:
     user_msg = f"Raw findings (finding_id = 0-based index):\n{payload}\n\nReturn Section 1 (Markdown developer summary), then Section 2 (single ```json code block with remediation_plan only, max 5 items)."
     key = key.strip().strip('"').strip("'")
-    client = OpenAI(api_key=key)
+    client = clients.openai(key)
     text = ""
     model = None
     last_error_detail = None
@@ -258,6 +407,7 @@ def run(raw_findings: list[dict]) -> dict:
         "analysis_meta": {
             "path": "openai",
             "reason": "ok",
+            "llm_reason": llm_reason,
             "model": model,
             "raw_findings": len(raw_findings),
             "raw_plan_items": len(plan_list),
@@ -0,0 +1,94 @@
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+STATE_DIR = os.environ.get("VIBESEC_STATE_DIR", "/tmp/vibesec")
+PROFILE_HEADER = "x-vibesec-profile"
+# Set on error responses, where the JSON body cannot carry the profile id.
+PROFILE_ID_HEADER = "x-vibesec-profile-id"
+MAX_PROFILES = 50
+
+# cProfile can only be active once per process on newer Pythons; concurrent requests just skip.
+_busy = threading.Lock()
+_PROFILE_ID = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+def _profile_dir() -> str:
+    return os.path.join(STATE_DIR, "profiles")
+
+
+def admin_ok(token: str) -> bool:
+    expected = os.environ.get("VIBESEC_PROFILE_TOKEN", "")
+    return bool(expected) and hmac.compare_digest(expected, token or "")
+
+
+def requested(header_value: str | None) -> bool:
+    if os.environ.get("VIBESEC_PROFILE") == "1":
+        return True
+    return bool(header_value) and admin_ok(header_value)
+
+
+def profile_id(repo_full_name: str, ref: str | None = None) -> str:
+    # Keyed by repo, ref and a per-job suffix: two scans in the same second never share a file.
+    stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+    key = repo_full_name.replace("/", "__")
+    if ref:
+        key = f"{key}-{ref.removeprefix('refs/heads/')[:40]}"
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", f"{key}-{stamp}-{uuid.uuid4().hex[:8]}")
+
+
+def path_for(pid: str) -> str | None:
+    if not _PROFILE_ID.match(pid):
+        return None
+    return os.path.join(_profile_dir(), pid + ".prof")
+
+
+def _prune() -> None:
+    d = _profile_dir()
+    files = sorted((os.path.join(d, n) for n in os.listdir(d) if n.endswith(".prof")), key=os.path.getmtime)
+    for old in files[:-MAX_PROFILES]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+
+
+@contextmanager
+def profile(pid: str):
+    result = {"profile_id": None}
+    if not _busy.acquire(blocking=False):
+        result["profile_skipped"] = "busy"
+        yield result
+        return
+    prof = cProfile.Profile()
+    try:
+        prof.enable()
+        yield result
+    finally:
+        # Failed scans are dumped too; they are often the slow ones.
+        prof.disable()
+        try:
+            os.makedirs(_profile_dir(), exist_ok=True)
+            prof.dump_stats(path_for(pid))
+            _prune()
+            result["profile_id"] = pid
+        except OSError:
+            result["profile_skipped"] = "write_failed"
+        _busy.release()
+
+
+def text_summary(pid: str, limit: int = 50) -> str | None:
+    path = path_for(pid)
+    if not path or not os.path.exists(path):
+        return None
+    buf = io.StringIO()
+    stats = pstats.Stats(path, stream=buf)
+    stats.sort_stats("cumulative").print_stats(limit)
+    return buf.getvalue()
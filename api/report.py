@@ -1,4 +1,20 @@
+import io
+import json
+import re
 from datetime import datetime, timezone
+from typing import Iterable, TextIO
+
+from api import baseline
+from api import prioritize
+
+MARKDOWN_FILE = "SECURITY_REPORT.md"
+SARIF_FILE = "SECURITY_REPORT.sarif"
+JSON_FILE = "SECURITY_REPORT.json"
+# Push-webhook scans only see the changed paths; their result never replaces the full report.
+INCREMENTAL_FILE = "SECURITY_REPORT.incremental.md"
+BUDGET_SKIP_REASONS = ("request_budget", "byte_budget", "lock_byte_budget")
+_SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+_TOOL_URI = "https://web-production-210eb.up.railway.app/"
 
 _EXT_TYPES = {
     "py": "Python", "js": "JavaScript", "ts": "TypeScript",
@@ -53,11 +69,174 @@ def _severity(f: dict) -> str:
     return "CRITICAL" if f.get("scanner") in ("secrets", "env") else "HIGH"
 
 
+def coverage_summary(coverage: dict, top: int = 10) -> dict:
+    # Coverage without the per-path skip list: counts per reason plus the first budget-skipped
+    # paths (already in risk order), so responses stay small on repos with huge node_modules.
+    skipped = coverage.get("skipped") or []
+    by_reason = {}
+    for s in skipped:
+        by_reason[s.get("reason", "unknown")] = by_reason.get(s.get("reason", "unknown"), 0) + 1
+    budget_skips = [s for s in skipped if s.get("reason") in BUDGET_SKIP_REASONS][:top]
+    summary = {k: v for k, v in coverage.items() if k != "skipped"}
+    summary["skipped_by_reason"] = by_reason
+    summary["budget_skipped"] = [{"path": s.get("path"), "size": s.get("size", 0)} for s in budget_skips]
+    return summary
+
+
+def _coverage_lines(coverage: dict) -> list[str]:
+    summary = coverage_summary(coverage)
+    lines = [
+        "## Scan Coverage",
+        "",
+        f"- Files Scanned: {coverage.get('scanned_files')} of {coverage.get('tree_blobs')}",
+        f"- Bytes Scanned: {coverage.get('scanned_bytes')} (budget {coverage.get('max_bytes') or 'unlimited'})",
+        f"- File Budget: {coverage.get('max_files') or 'unlimited'}",
+    ]
+    if coverage.get("max_lock_bytes"):
+        lines.append(f"- Lockfile Byte Budget: {coverage['max_lock_bytes']}")
+    if coverage.get("commit"):
+        lines.insert(2, f"- Ref: {coverage.get('ref')} ({coverage['commit'][:7]})")
+    if coverage.get("incremental"):
+        lines.insert(2, f"- Scope: changed paths only (full report: {MARKDOWN_FILE})")
+    for reason, n in sorted(summary["skipped_by_reason"].items()):
+        lines.append(f"- Skipped ({reason}): {n}")
+    if summary["budget_skipped"]:
+        lines.append("")
+        lines.append("Highest-risk files skipped by budget:")
+        for s in summary["budget_skipped"]:
+            lines.append(f"- {s['path']} ({s['size']} bytes)")
+    lines.append("")
+    return lines
+
+
+def _rule_id(f: dict) -> str:
+    scanner = f.get("scanner", "finding")
+    if scanner == "env":
+        name = f.get("issue", "exposure")
+    elif scanner == "dependencies":
+        name = f.get("cve_id", "vulnerable-dependency")
+    else:
+        name = f.get("pattern_name", "secret")
+    return f"{scanner}/" + re.sub(r"[^a-z0-9.-]+", "-", name.lower()).strip("-")
+
+
+def _sarif_rule(f: dict) -> dict:
+    owasp = prioritize._owasp_fields(f)
+    rule = {
+        "id": _rule_id(f),
+        "name": _title(f),
+        "shortDescription": {"text": _title(f)},
+        "fullDescription": {"text": owasp["owasp_category"]},
+        "help": {"text": "\n".join(owasp["standard_fix_requirements"]) or "Address the finding."},
+        "properties": {"tags": ["security", owasp["owasp_category"]]},
+    }
+    if owasp["owasp_refs"]:
+        rule["helpUri"] = owasp["owasp_refs"][0]
+    return rule
+
+
+def _sarif_result(f: dict) -> dict:
+    message = _title(f)
+    if f.get("detail") or f.get("summary"):
+        message = f"{message}: {f.get('detail') or f.get('summary')}"
+    result = {
+        "ruleId": _rule_id(f),
+        "level": "error" if _severity(f) == "CRITICAL" else "warning",
+        "message": {"text": message},
+        "partialFingerprints": {"vibesecFinding/v1": baseline.fingerprint(f, b"").hex()},
+    }
+    if f.get("path"):
+        location = {"artifactLocation": {"uri": f["path"]}}
+        if f.get("line_no"):
+            location["region"] = {"startLine": f["line_no"]}
+        result["locations"] = [{"physicalLocation": location}]
+    return result
+
+
+def _redact(value: str) -> str:
+    # Enough of the start to recognise the key type (AKIA, ghp_, sk-...), never the secret itself.
+    keep = 6 if len(value) > 16 else 2
+    return value[:keep] + "****"
+
+
+def _json_finding(f: dict) -> dict:
+    # The JSON file is committed to the scanned branch: no source lines, and secret evidence
+    # is masked. Location fields (path, line_no) stay for tooling.
+    out = {k: v for k, v in f.items() if k != "line_content"}
+    if f.get("scanner") == "secrets" and f.get("evidence"):
+        out["evidence"] = _redact(str(f["evidence"]))
+    return out
+
+
+def stream_findings(
+    findings: Iterable[dict],
+    repo_name: str,
+    json_out: TextIO,
+    sarif_out: TextIO,
+    scanned_at: str | None = None,
+) -> dict:
+    # One pass over the findings writes both documents incrementally; only the distinct
+    # rules and per-scanner counts are held, so memory is independent of the finding count.
+    # SARIF's tool/rules object is written after the results (key order is not significant).
+    scanned_at = scanned_at or datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    compact = {"separators": (",", ":")}
+    json_out.write(f'{{"repo":{json.dumps(repo_name)},"scanned_at":"{scanned_at}","findings":[')
+    sarif_out.write(f'{{"$schema":"{_SARIF_SCHEMA}","version":"2.1.0","runs":[{{"results":[')
+    rules = {}
+    by_scanner = {}
+    total = 0
+    for f in findings:
+        sep = "," if total else ""
+        json_out.write(sep + "\n" + json.dumps(_json_finding(f), **compact))
+        sarif_out.write(sep + "\n" + json.dumps(_sarif_result(f), **compact))
+        rule_id = _rule_id(f)
+        if rule_id not in rules:
+            rules[rule_id] = _sarif_rule(f)
+        scanner = f.get("scanner", "")
+        by_scanner[scanner] = by_scanner.get(scanner, 0) + 1
+        total += 1
+    counts = {"total": total, "by_scanner": by_scanner}
+    json_out.write(f'\n],"counts":{json.dumps(counts, **compact)}}}\n')
+    driver = {"name": "VibeSec", "informationUri": _TOOL_URI, "rules": list(rules.values())}
+    sarif_out.write(
+        f'\n],"tool":{{"driver":{json.dumps(driver, **compact)}}},'
+        f'"automationDetails":{{"id":"vibesec/{scanned_at}"}}}}]}}\n'
+    )
+    return counts
+
+
+def render_all(
+    raw_findings: Iterable[dict],
+    prioritized_findings: list[dict],
+    repo_name: str,
+    developer_summary: str | None = None,
+    analysis_meta: dict | None = None,
+    coverage: dict | None = None,
+    suppression: dict | None = None,
+) -> dict[str, str]:
+    json_out = io.StringIO()
+    sarif_out = io.StringIO()
+    counts = stream_findings(raw_findings, repo_name, json_out, sarif_out)
+    markdown = generate(
+        prioritized_findings,
+        repo_name,
+        developer_summary=developer_summary,
+        analysis_meta=analysis_meta,
+        coverage=coverage,
+        suppression=suppression,
+        total_findings=counts["total"],
+    )
+    return {MARKDOWN_FILE: markdown, SARIF_FILE: sarif_out.getvalue(), JSON_FILE: json_out.getvalue()}
+
+
 def generate(
     prioritized_findings: list[dict],
     repo_name: str,
     developer_summary: str | None = None,
     analysis_meta: dict | None = None,
+    coverage: dict | None = None,
+    suppression: dict | None = None,
+    total_findings: int | None = None,
 ) -> str:
     ts = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
     count = len(prioritized_findings)
@@ -66,8 +245,17 @@ def generate(
         f"Repo: {repo_name}",
         f"Scanned: {ts}",
         f"Issues Found: {count}",
-        "",
     ]
+    if total_findings is not None:
+        lines.append(f"All Findings: {total_findings} (full list in {JSON_FILE} and {SARIF_FILE})")
+    lines.append("")
+    if isinstance(coverage, dict) and coverage:
+        lines.extend(_coverage_lines(coverage))
+    if isinstance(suppression, dict) and suppression.get("suppressed"):
+        lines.extend(["## Baseline", "", f"- Suppressed Findings: {suppression['suppressed']}"])
+        for scanner, n in sorted((suppression.get("by_scanner") or {}).items()):
+            lines.append(f"- Suppressed ({scanner}): {n}")
+        lines.extend([f"- Baseline Entries: {suppression.get('baseline_entries')}", ""])
     if count == 0:
         lines.append("Scan passed; no issues found.")
         return "\n".join(lines)
@@ -115,6 +303,8 @@ def generate(
             lines.append(f"**CVE:** {f['cve_id']}")
         if f.get("detail"):
             lines.append(f"**Detail:** {f['detail']}")
+        if f.get("risk_score") is not None:
+            lines.append(f"**Risk Score:** {f['risk_score']}")
         lines.append(f"**Risk:** {f.get('risk_explanation', 'Security issue.')}")
         lines.append("")
         owasp_category = f.get("owasp_category")
@@ -0,0 +1,198 @@
+import argparse
+import socketserver
+import sys
+import threading
+import time
+
+from api import cache
+
+# In-process Redis-protocol (RESP2) stand-in with just the commands RedisCache issues:
+# PING, AUTH, SELECT, GET, SET [NX] [PX ms], DEL and EVAL of the lock-release script.
+# Lets tests and local runs exercise VIBESEC_CACHE_URL=redis://... without a Redis server.
+
+
+class _Store:
+    def __init__(self):
+        self.data = {}
+        self.mu = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        if entry[0] is not None and entry[0] <= time.time():
+            del self.data[key]
+            return None
+        return entry[1]
+
+
+def _encode(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, int):
+        return f":{value}\r\n".encode()
+    if isinstance(value, Exception):
+        return f"-ERR {value}\r\n".encode()
+    if value == "OK" or value == "PONG":
+        return f"+{value}\r\n".encode()
+    b = value.encode("utf-8")
+    return f"${len(b)}\r\n".encode() + b + b"\r\n"
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def _read_command(self) -> list[str] | None:
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.decode("utf-8").split()
+        args = []
+        for _ in range(int(line[1:-2])):
+            n = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(n + 2)[:-2].decode("utf-8"))
+        return args
+
+    def handle(self) -> None:
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            try:
+                reply = self.server.execute(args)
+            except Exception as e:
+                reply = e
+            self.wfile.write(_encode(reply))
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, password: str | None = None):
+        super().__init__((host, port), _Handler)
+        self.password = password
+        self.store = _Store()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        auth = f":{self.password}@" if self.password else ""
+        return f"redis://{auth}{host}:{port}/0"
+
+    def start(self) -> "RespServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="resp-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def execute(self, args: list[str]):
+        cmd = args[0].upper()
+        store = self.store
+        with store.mu:
+            if cmd == "PING":
+                return "PONG"
+            if cmd == "AUTH":
+                if self.password and args[-1] != self.password:
+                    raise ValueError("invalid password")
+                return "OK"
+            if cmd == "SELECT":
+                return "OK"
+            if cmd == "GET":
+                return store.get(args[1])
+            if cmd == "DEL":
+                return sum(1 for k in args[1:] if store.data.pop(k, None) is not None)
+            if cmd == "SET":
+                key, value, opts = args[1], args[2], [a.upper() for a in args[3:]]
+                expires = None
+                if "PX" in opts:
+                    expires = time.time() + int(args[3 + opts.index("PX") + 1]) / 1000.0
+                if "NX" in opts and store.get(key) is not None:
+                    return None
+                store.data[key] = (expires, value)
+                return "OK"
+            if cmd == "EVAL" and args[1] == cache._RELEASE_SCRIPT:
+                if store.get(args[3]) == args[4]:
+                    del store.data[args[3]]
+                    return 1
+                return 0
+        raise ValueError(f"unknown command '{args[0]}'")
+
+
+def check(url: str) -> list[str]:
+    # Round-trips every RedisCache operation; returns the names of the failed checks.
+    c = cache.from_url(url)
+    failed = []
+    c.set("check:value", {"a": [1, 2]}, 60)
+    if c.get("check:value") != {"a": [1, 2]}:
+        failed.append("get/set")
+    c.delete("check:value")
+    if c.get("check:value") is not None:
+        failed.append("delete")
+    c.set("check:ttl", 1, 0.05)
+    time.sleep(0.1)
+    if c.get("check:ttl") is not None:
+        failed.append("ttl")
+    with c.lock("check:lock", ttl=5, wait=0) as first:
+        with c.lock("check:lock", ttl=5, wait=0) as second:
+            if not first or second:
+                failed.append("lock")
+    with c.lock("check:lock", ttl=5, wait=0) as again:
+        if not again:
+            failed.append("unlock")
+    calls = []
+    for _ in range(2):
+        c.get_or_set("check:loaded", 60, lambda: calls.append(1) or "v")
+    if len(calls) != 1:
+        failed.append("get_or_set")
+    c.delete("check:loaded")
+    return failed
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m api.resp_server",
+        description="Run a minimal Redis-protocol stand-in, or check RedisCache against one.",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--password", default=None)
+    parser.add_argument(
+        "--check",
+        nargs="?",
+        const="",
+        metavar="URL",
+        help="exercise RedisCache against URL (default: a throwaway in-process stand-in) and exit",
+    )
+    args = parser.parse_args(argv)
+
+    if args.check is not None:
+        server = None
+        url = args.check
+        if not url:
+            server = RespServer(args.host, 0, args.password).start()
+            url = server.url
+        try:
+            failed = check(url)
+        finally:
+            if server:
+                server.stop()
+        print("ok" if not failed else "failed: " + ", ".join(failed))
+        return 1 if failed else 0
+
+    server = RespServer(args.host, args.port, args.password)
+    print(f"listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,26 @@
 import json
 import re
-import httpx
+from concurrent.futures import ThreadPoolExecutor
 
-OSV_URL = "https://api.osv.dev/v1/query"
+from api import cache
+from api import clients
+
+OSV_BATCH_URL = "https://api.osv.dev/v1/querybatch"
+OSV_VULN_URL = "https://api.osv.dev/v1/vulns"
 HIGH_SEV = {"CRITICAL", "HIGH"}
+OSV_BATCH_SIZE = 1000
+OSV_DETAIL_WORKERS = 8
+OSV_CACHE_TTL = 6 * 3600.0
+
+LOCKFILES = {"package-lock.json": "npm", "yarn.lock": "npm", "poetry.lock": "PyPI"}
+_REQUIREMENTS_NAME = re.compile(r"(.*[-_.])?requirements([-_.].*)?\.txt$")
+_NPM_LOCK_TOKEN = re.compile(r'"((?:[^"\\]|\\.)*)"\s*:\s*\{|"version"\s*:\s*"([^"]*)"|([{}])')
+_NPM_LOCK_NON_PACKAGES = {
+    "", "packages", "dependencies", "devDependencies", "optionalDependencies", "peerDependencies",
+    "peerDependenciesMeta", "requires", "engines", "bin", "funding", "directories", "workspaces",
+}
+_YARN_VERSION = re.compile(r'^\s+version:?\s+"?([^"\s]+)"?')
+_TOML_STRING = re.compile(r'^(name|version)\s*=\s*"([^"]*)"')
 
 
 def _parse_requirements(content: str) -> list[tuple[str, str]]:
@@ -39,55 +56,207 @@ def _parse_package_json(content: str) -> list[tuple[str, str]]:
     return out
 
 
-def _query_osv(pkg: str, ver: str, ecosystem: str) -> list[dict]:
-    try:
-        r = httpx.post(
-            OSV_URL,
-            json={"package": {"name": pkg, "ecosystem": ecosystem}, "version": ver},
-            timeout=15.0,
-        )
-        r.raise_for_status()
-        data = r.json()
-    except Exception:
-        return []
-    vulns = data.get("vulns") or []
-    out = []
-    for v in vulns:
-        sev = (v.get("database_specific") or {}).get("severity", "").upper()
-        if sev not in HIGH_SEV:
+def _iter_package_lock(content: str):
+    # Token scan instead of json.loads: only package keys and "version" values are materialised.
+    # Brace depth is tracked so entries directly under "packages" (lockfile v2/v3) are only
+    # taken when they are node_modules/ paths; the others are workspaces like "packages/web".
+    key = None
+    depth = 0
+    section = None
+    for m in _NPM_LOCK_TOKEN.finditer(content):
+        if m.group(3) is not None:
+            depth += 1 if m.group(3) == "{" else -1
             continue
-        vid = v.get("id", "")
-        if "CVE-" not in vid:
+        if m.group(1) is not None:
+            key = m.group(1)
+            if depth == 1:
+                section = key
+            elif depth == 2 and section == "packages" and "node_modules/" not in key:
+                key = None
+            depth += 1
             continue
-        summary = (v.get("summary") or v.get("details") or "")[:200]
-        out.append({"id": vid, "severity": sev, "summary": summary})
-    return out
+        if key is None or key in _NPM_LOCK_NON_PACKAGES:
+            continue
+        name = key.rsplit("node_modules/", 1)[-1]
+        if name:
+            yield name, m.group(2) or "0.0.0"
+        key = None
+
+
+def _yarn_name(spec: str) -> str:
+    spec = spec.strip().strip('"')
+    at = spec.find("@", 1)
+    return spec[:at] if at > 0 else spec
+
+
+def _iter_yarn_lock(content: str):
+    name = None
+    for line in content.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        if not line[0].isspace():
+            header = line.rstrip().rstrip(":")
+            name = None if header.startswith("__metadata") else _yarn_name(header.split(",", 1)[0])
+            continue
+        if name is None:
+            continue
+        m = _YARN_VERSION.match(line)
+        if m:
+            if not m.group(1).startswith("0.0.0-use.local"):
+                yield name, m.group(1)
+            name = None
+
+
+def _iter_poetry_lock(content: str):
+    name = version = None
+    in_package = False
+    for line in content.splitlines():
+        line = line.strip()
+        if line.startswith("["):
+            in_package = line == "[[package]]"
+            name = version = None
+            continue
+        if not in_package:
+            continue
+        m = _TOML_STRING.match(line)
+        if not m:
+            continue
+        if m.group(1) == "name":
+            name = m.group(2)
+        else:
+            version = m.group(2)
+        if name and version:
+            yield name, version
+            in_package = False
+
+
+def _dir_of(path: str) -> str:
+    return path.rsplit("/", 1)[0] if "/" in path else ""
+
+
+def _collect_packages(files: list[dict]) -> dict[tuple[str, str, str], str]:
+    # (ecosystem, package, version) -> first manifest path that declared it.
+    lock_dirs = {}
+    for f in files:
+        path = f.get("path", "")
+        ecosystem = LOCKFILES.get(path.rsplit("/", 1)[-1])
+        if ecosystem:
+            lock_dirs.setdefault(_dir_of(path), set()).add(ecosystem)
+    packages = {}
+    for f in files:
+        path = f.get("path", "")
+        name = path.rsplit("/", 1)[-1]
+        content = f.get("content", "")
+        locked = lock_dirs.get(_dir_of(path), set())
+        if name == "package-lock.json":
+            entries, ecosystem = _iter_package_lock(content), "npm"
+        elif name == "yarn.lock":
+            entries, ecosystem = _iter_yarn_lock(content), "npm"
+        elif name == "poetry.lock":
+            entries, ecosystem = _iter_poetry_lock(content), "PyPI"
+        elif name == "package.json" and "npm" not in locked:
+            entries, ecosystem = _parse_package_json(content), "npm"
+        elif _REQUIREMENTS_NAME.match(name) and "PyPI" not in locked:
+            entries, ecosystem = _parse_requirements(content), "PyPI"
+        else:
+            continue
+        for pkg, ver in entries:
+            packages.setdefault((ecosystem, pkg, ver), path)
+    return packages
+
+
+def _vuln_to_finding(v: dict) -> dict | None:
+    sev = (v.get("database_specific") or {}).get("severity", "").upper()
+    if sev not in HIGH_SEV:
+        return None
+    vid = v.get("id", "")
+    if "CVE-" not in vid:
+        aliases = [a for a in (v.get("aliases") or []) if "CVE-" in a]
+        if not aliases:
+            return None
+        vid = aliases[0]
+    summary = (v.get("summary") or v.get("details") or "")[:200]
+    return {"id": vid, "severity": sev, "summary": summary}
+
+
+def _query_osv_batch(keys: list[tuple[str, str, str]]) -> dict[tuple[str, str, str], list[dict]]:
+    # querybatch only returns vuln ids; details are fetched once per distinct id.
+    # Every key OSV fully answered is in the result (possibly empty); keys in failed chunks or
+    # with a failed detail lookup are left out so the caller never caches a partial answer.
+    ids_by_key = {}
+    client = clients.osv()
+    for i in range(0, len(keys), OSV_BATCH_SIZE):
+        chunk = keys[i : i + OSV_BATCH_SIZE]
+        try:
+            r = client.post(
+                OSV_BATCH_URL,
+                json={"queries": [
+                    {"package": {"name": pkg, "ecosystem": eco}, "version": ver} for eco, pkg, ver in chunk
+                ]},
+            )
+            r.raise_for_status()
+            results = r.json().get("results") or []
+        except Exception:
+            continue
+        for key, res in zip(chunk, results):
+            ids_by_key[key] = [v.get("id") for v in (res or {}).get("vulns") or [] if v.get("id")]
+    unique_ids = sorted({vid for ids in ids_by_key.values() for vid in ids})
+
+    def _detail(vid: str) -> tuple[str, dict | None, bool]:
+        try:
+            r = client.get(f"{OSV_VULN_URL}/{vid}")
+            r.raise_for_status()
+            return vid, _vuln_to_finding(r.json()), True
+        except Exception:
+            return vid, None, False
+
+    with ThreadPoolExecutor(max_workers=OSV_DETAIL_WORKERS) as pool:
+        fetched = list(pool.map(clients.bind(_detail), unique_ids))
+    details = {vid: finding for vid, finding, _ in fetched}
+    failed = {vid for vid, _, ok in fetched if not ok}
+    return {
+        key: [details[vid] for vid in ids if details.get(vid)]
+        for key, ids in ids_by_key.items()
+        if not failed.intersection(ids)
+    }
+
+
+def _query_osv_cached(keys: list[tuple[str, str, str]]) -> dict[tuple[str, str, str], list[dict]]:
+    shared = cache.get_cache()
+    results = {}
+    misses = []
+    for key in keys:
+        hit = shared.get("osv:" + "\0".join(key))
+        if hit is None:
+            misses.append(key)
+        else:
+            results[key] = hit
+    if misses:
+        for key, vulns in _query_osv_batch(misses).items():
+            shared.set("osv:" + "\0".join(key), vulns, OSV_CACHE_TTL)
+            results[key] = vulns
+    return results
 
 
 def scan(files: list[dict]) -> list[dict]:
     findings = []
-    req_file = next((f for f in files if f.get("path", "").endswith("requirements.txt")), None)
-    pkg_file = next((f for f in files if f.get("path", "").endswith("package.json")), None)
-    if req_file:
-        for pkg, ver in _parse_requirements(req_file["content"])[:20]:
-            for v in _query_osv(pkg, ver, "PyPI"):
-                findings.append({
-                    "scanner": "dependencies",
-                    "package": pkg,
-                    "version": ver,
-                    "cve_id": v["id"],
-                    "severity": v["severity"],
-                    "summary": v["summary"],
-                })
-    if pkg_file:
-        for pkg, ver in _parse_package_json(pkg_file["content"])[:20]:
-            for v in _query_osv(pkg, ver, "npm"):
-                findings.append({
-                    "scanner": "dependencies",
-                    "package": pkg,
-                    "version": ver,
-                    "cve_id": v["id"],
-                    "severity": v["severity"],
-                    "summary": v["summary"],
-                })
+    packages = _collect_packages(files)
+    if not packages:
+        return findings
+    results = _query_osv_cached(list(packages))
+    for (ecosystem, pkg, ver), vulns in results.items():
+        seen = set()
+        for v in vulns:
+            if v["id"] in seen:
+                continue
+            seen.add(v["id"])
+            findings.append({
+                "scanner": "dependencies",
+                "path": packages[(ecosystem, pkg, ver)],
+                "package": pkg,
+                "version": ver,
+                "cve_id": v["id"],
+                "severity": v["severity"],
+                "summary": v["summary"],
+            })
     return findings
@@ -1,5 +1,9 @@
+import bisect
+import hashlib
 import re
 
+from api import cache
+from api import github_client
 
 SECRET_PATTERNS = [
     ("OpenAI API Key", re.compile(r"sk-[a-zA-Z0-9]{20,}")),
@@ -8,12 +12,69 @@ SECRET_PATTERNS = [
     ("Stripe Publishable Key", re.compile(r"pk_live_[a-zA-Z0-9]{24,}")),
     ("GitHub Token", re.compile(r"ghp_[a-zA-Z0-9]{36}")),
 ]
+# Literal prefix every SECRET_PATTERNS match starts with; a cheap `in` check gates each regex.
+ANCHORS = {
+    "OpenAI API Key": "sk-",
+    "AWS Access Key": "AKIA",
+    "Stripe Secret Key": "sk_live_",
+    "Stripe Publishable Key": "pk_live_",
+    "GitHub Token": "ghp_",
+}
 GENERIC = re.compile(
     r"(password|secret|api_key)\s*=\s*['\"]?([^'\"\s]{9,})['\"]?",
     re.IGNORECASE,
 )
 PLACEHOLDERS = {"your_key_here", "xxx", "changeme", "example", "placeholder", "secret", "password"}
 
+# Candidate tokens for the entropy detector: runs of base64/hex/url-safe characters.
+ENTROPY_TOKEN = re.compile(r"(?<![A-Za-z0-9+/=_\-])[A-Za-z0-9+/_\-]{20,200}={0,2}(?![A-Za-z0-9+/=_\-])")
+ENTROPY_CONTEXT = re.compile(r"(key|token|secret|passw|auth|credential|bearer|private)", re.IGNORECASE)
+# Thresholds are a fraction of the highest entropy a token can reach, log2(min(length, alphabet)):
+# a 20-char token tops out at 4.32 bits/char, so a fixed base64 cutoff would miss short keys.
+# 0.84 keeps ~99% of random mixed-case alphanumeric tokens of 20-32 chars (~88% at 64) while
+# long camelCase identifiers with a digit (~0.81) stay below it.
+HEX_ALPHABET = 16
+BASE64_ALPHABET = 64
+HEX_ENTROPY_FRACTION = 0.75
+BASE64_ENTROPY_FRACTION = 0.84
+ENTROPY_BATCH = 4096
+LOCKFILE_NAMES = ("package-lock.json", "yarn.lock", "poetry.lock", "pnpm-lock.yaml", "pipfile.lock", "go.sum", "cargo.lock")
+INTEGRITY_PREFIXES = ("sha1-", "sha256-", "sha384-", "sha512-")
+BLOB_CACHE_TTL = 86400.0
+# line_content is cropped to this many characters either side of the match, so a hit in a
+# 100 KB single-line bundle costs the same as a hit in ordinary source.
+EVIDENCE_WINDOW = 80
+EVIDENCE_MATCH_CAP = 120
+
+# Files that are not hand-written source get the anchor-only scan (no generic/entropy rules).
+VENDOR_DIRS = {"vendor", "vendors", "third_party", "third-party", "bower_components", "jspm_packages", "site-packages"}
+GENERATED_SUFFIXES = (".min.js", ".min.css", "-min.js", ".bundle.js", ".chunk.js", ".map", "_pb2.py", ".pb.go", ".g.dart")
+GENERATED_MARKERS = ("@generated", "code generated by", "do not edit", "autogenerated", "auto-generated")
+CLASSIFY_SAMPLE = 65536
+MINIFIED_LONG_LINE = 500
+MINIFIED_LONG_SHARE = 0.3
+
+_LUTS = {}
+
+
+def _luts() -> dict:
+    # numpy is imported on first use so it stays off the server's cold-start path.
+    if not _LUTS:
+        import numpy as np
+
+        luts = {"np": np}
+        for name, chars in (
+            ("hex", b"0123456789abcdefABCDEF"),
+            ("digit", b"0123456789"),
+            ("upper", b"ABCDEFGHIJKLMNOPQRSTUVWXYZ"),
+            ("lower", b"abcdefghijklmnopqrstuvwxyz"),
+        ):
+            lut = np.zeros(256, dtype=bool)
+            lut[np.frombuffer(chars, dtype=np.uint8)] = True
+            luts[name] = lut
+        _LUTS.update(luts)
+    return _LUTS
+
 
 def _is_placeholder(val: str) -> bool:
     v = val.lower().strip()
@@ -22,31 +83,224 @@ def _is_placeholder(val: str) -> bool:
     return v in PLACEHOLDERS or v.startswith("your_") or v.startswith("<") or v.endswith(">")
 
 
+def _batch_entropy(tokens: list[str]) -> list[tuple[int, bool]]:
+    # One flat byte buffer for the whole batch; per-token histograms via a single bincount.
+    # Returns (index, is_hex) for every token above its charset's threshold.
+    luts = _luts()
+    np = luts["np"]
+    lengths = np.fromiter((len(t) for t in tokens), dtype=np.int64, count=len(tokens))
+    buf = np.frombuffer("".join(tokens).encode("ascii"), dtype=np.uint8)
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    rows = np.repeat(np.arange(len(tokens)), lengths)
+    counts = np.bincount(rows * 256 + buf, minlength=len(tokens) * 256).reshape(len(tokens), 256)
+    probs = counts / lengths[:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        entropy = -np.where(probs > 0, probs * np.log2(probs), 0.0).sum(axis=1)
+    is_hex = np.logical_and.reduceat(luts["hex"][buf], offsets)
+    mixed = (
+        np.logical_or.reduceat(luts["digit"][buf], offsets)
+        & np.logical_or.reduceat(luts["upper"][buf], offsets)
+        & np.logical_or.reduceat(luts["lower"][buf], offsets)
+    )
+    hex_min = HEX_ENTROPY_FRACTION * np.log2(np.minimum(lengths, HEX_ALPHABET))
+    base64_min = BASE64_ENTROPY_FRACTION * np.log2(np.minimum(lengths, BASE64_ALPHABET))
+    hits = np.flatnonzero(np.where(is_hex, entropy >= hex_min, mixed & (entropy >= base64_min)))
+    return [(int(i), bool(is_hex[i])) for i in hits]
+
+
+def _skip_entropy_token(content: str, start: int, tok: str) -> bool:
+    if tok.count("/") > 1 or _is_placeholder(tok) or tok.lower().startswith(INTEGRITY_PREFIXES):
+        return True
+    before = content[max(0, start - 8) : start].lower()
+    if before.endswith(INTEGRITY_PREFIXES) or before.endswith(("://", "/")):
+        return True
+    return any(pat.search(tok) for _, pat in SECRET_PATTERNS)
+
+
+def _line_at(content: str, newlines: list[int], pos: int) -> tuple[int, int, str]:
+    # Returns (line number, offset of the line start, line text).
+    idx = bisect.bisect_left(newlines, pos)
+    start = newlines[idx - 1] + 1 if idx > 0 else 0
+    end = newlines[idx] if idx < len(newlines) else len(content)
+    return idx + 1, start, content[start:end]
+
+
+def _window(line: str, start: int, end: int) -> str:
+    # The match itself is capped too: sk-... and GENERIC are unbounded and can span a whole line.
+    end = min(end, start + EVIDENCE_MATCH_CAP)
+    lo = max(0, start - EVIDENCE_WINDOW)
+    hi = min(len(line), end + EVIDENCE_WINDOW)
+    out = line[lo:hi].strip()
+    if lo > 0 and line[:lo].strip():
+        out = "..." + out
+    if hi < len(line) and line[hi:].strip():
+        out = out + "..."
+    return out
+
+
+def _is_secret_or_config(path: str) -> bool:
+    name = path.lower().rsplit("/", 1)[-1]
+    ext = name.rsplit(".", 1)[-1] if "." in name else ""
+    return (
+        name.startswith(".env")
+        or name in github_client._SECRET_NAMES
+        or name in github_client._CONFIG_NAMES
+        or ext in github_client._SECRET_EXTS
+    )
+
+
+def classify(path: str, content: str) -> str:
+    # "vendored", "generated", "minified" or "source"; decided from the path, a header
+    # sample and the share of long lines in the first CLASSIFY_SAMPLE characters.
+    # Secret and config files always get the full rule set, however long their lines.
+    if _is_secret_or_config(path):
+        return "source"
+    p = path.lower()
+    if any(part in VENDOR_DIRS for part in p.split("/")[:-1]):
+        return "vendored"
+    if p.endswith(GENERATED_SUFFIXES):
+        return "generated"
+    head = content[:1024].lower()
+    if any(marker in head for marker in GENERATED_MARKERS):
+        return "generated"
+    lines = [line for line in content[:CLASSIFY_SAMPLE].split("\n") if line.strip()]
+    if not lines:
+        return "source"
+    long_lines = sum(1 for line in lines if len(line) > MINIFIED_LONG_LINE)
+    # One embedded data URI or certificate does not make a file minified; mostly-long lines do.
+    if long_lines / len(lines) >= MINIFIED_LONG_SHARE:
+        return "minified"
+    return "source"
+
+
+def scan_anchors(path: str, content: str) -> list[dict]:
+    # Fast path for non-source files: only the vendor-prefixed patterns, run over the whole
+    # content (no per-line split) and only when their literal anchor occurs at all.
+    findings = []
+    newlines = None
+    for name, pat in SECRET_PATTERNS:
+        if ANCHORS[name] not in content:
+            continue
+        for m in pat.finditer(content):
+            if newlines is None:
+                newlines = [n.start() for n in re.finditer("\n", content)]
+            line_no, line_start, line = _line_at(content, newlines, m.start())
+            findings.append({
+                "scanner": "secrets",
+                "path": path,
+                "line_no": line_no,
+                "line_content": _window(line, m.start() - line_start, m.end() - line_start),
+                "pattern_name": name,
+                "evidence": m.group(0)[:50] + ("..." if len(m.group(0)) > 50 else ""),
+            })
+    return findings
+
+
+def scan_entropy(path: str, content: str) -> list[dict]:
+    if path.lower().rsplit("/", 1)[-1] in LOCKFILE_NAMES:
+        return []
+    # Values already reported as "Generic secret" are not reported again as high entropy.
+    # finditer spans are sorted and disjoint, so one bisect per candidate finds any overlap.
+    generic = [
+        m.span(2) for m in GENERIC.finditer(content) if "\n" not in m.group(0) and not _is_placeholder(m.group(2))
+    ]
+    g_starts = [start for start, _ in generic]
+    spans = []
+    for m in ENTROPY_TOKEN.finditer(content):
+        i = bisect.bisect_right(g_starts, m.start()) - 1
+        if (i >= 0 and generic[i][1] > m.start()) or (i + 1 < len(generic) and g_starts[i + 1] < m.end()):
+            continue
+        if not _skip_entropy_token(content, m.start(), m.group(0)):
+            spans.append((m.start(), m.group(0)))
+    if not spans:
+        return []
+    findings = []
+    newlines = None
+    for b in range(0, len(spans), ENTROPY_BATCH):
+        batch = spans[b : b + ENTROPY_BATCH]
+        for i, is_hex in _batch_entropy([t for _, t in batch]):
+            start, tok = batch[i]
+            # Hex runs are commonly hashes/ids; only report them next to a secret-ish name.
+            if is_hex and not ENTROPY_CONTEXT.search(content[max(0, start - 40) : start]):
+                continue
+            if newlines is None:
+                newlines = [m.start() for m in re.finditer("\n", content)]
+            line_no, line_start, line = _line_at(content, newlines, start)
+            findings.append({
+                "scanner": "secrets",
+                "path": path,
+                "line_no": line_no,
+                "line_content": _window(line, start - line_start, start - line_start + len(tok)),
+                "pattern_name": "High Entropy String",
+                "evidence": tok[:50] + ("..." if len(tok) > 50 else ""),
+            })
+    return findings
+
+
+def _rules_hash() -> str:
+    # Cached per-blob results are only valid for the rules that produced them.
+    parts = [p.pattern for _, p in SECRET_PATTERNS]
+    parts += [GENERIC.pattern, ENTROPY_TOKEN.pattern, ENTROPY_CONTEXT.pattern, *sorted(PLACEHOLDERS)]
+    parts += [str(HEX_ENTROPY_FRACTION), str(BASE64_ENTROPY_FRACTION), *INTEGRITY_PREFIXES]
+    parts += [str(EVIDENCE_WINDOW), str(EVIDENCE_MATCH_CAP), str(MINIFIED_LONG_LINE), str(MINIFIED_LONG_SHARE)]
+    parts += sorted(VENDOR_DIRS)
+    parts += [*GENERATED_SUFFIXES, *GENERATED_MARKERS]
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()[:12]
+
+
+def _scan_file(path: str, content: str, kind: str | None = None) -> list[dict]:
+    if (kind or classify(path, content)) != "source":
+        return scan_anchors(path, content)
+    findings = []
+    anchored = [(name, pat) for name, pat in SECRET_PATTERNS if ANCHORS[name] in content]
+    for i, line in enumerate(content.splitlines(), 1):
+        for name, pat in anchored:
+            for m in pat.finditer(line):
+                findings.append({
+                    "scanner": "secrets",
+                    "path": path,
+                    "line_no": i,
+                    "line_content": _window(line, m.start(), m.end()),
+                    "pattern_name": name,
+                    "evidence": m.group(0)[:50] + ("..." if len(m.group(0)) > 50 else ""),
+                })
+        for m in GENERIC.finditer(line):
+            val = m.group(2)
+            if not _is_placeholder(val):
+                findings.append({
+                    "scanner": "secrets",
+                    "path": path,
+                    "line_no": i,
+                    "line_content": _window(line, m.start(), m.end()),
+                    "pattern_name": "Generic secret",
+                    "evidence": m.group(0)[:60] + ("..." if len(m.group(0)) > 60 else ""),
+                })
+    findings.extend(scan_entropy(path, content))
+    return findings
+
+
 def scan(files: list[dict]) -> list[dict]:
     findings = []
+    rules = None
     for f in files:
         path = f.get("path", "")
         content = f.get("content", "")
-        for i, line in enumerate(content.splitlines(), 1):
-            for name, pat in SECRET_PATTERNS:
-                for m in pat.finditer(line):
-                    findings.append({
-                        "scanner": "secrets",
-                        "path": path,
-                        "line_no": i,
-                        "line_content": line.strip(),
-                        "pattern_name": name,
-                        "evidence": m.group(0)[:50] + ("..." if len(m.group(0)) > 50 else ""),
-                    })
-            for m in GENERIC.finditer(line):
-                val = m.group(2)
-                if not _is_placeholder(val):
-                    findings.append({
-                        "scanner": "secrets",
-                        "path": path,
-                        "line_no": i,
-                        "line_content": line.strip(),
-                        "pattern_name": "Generic secret",
-                        "evidence": m.group(0)[:60] + ("..." if len(m.group(0)) > 60 else ""),
-                    })
+        if path.lower().rsplit("/", 1)[-1] in LOCKFILE_NAMES:
+            continue
+        sha = f.get("sha")
+        if not sha:
+            findings.extend(_scan_file(path, content))
+            continue
+        # Files carrying a blob sha (GitHub scans) share results across branches and
+        # repeat scans: identical content is scanned once, findings stored without a path.
+        # The classification depends on the path too, so it is part of the key.
+        rules = rules or _rules_hash()
+        kind = classify(path, content)
+        key = f"secrets:{rules}:{kind}:{sha}"
+        shared = cache.get_cache()
+        hits = shared.get(key)
+        if hits is None:
+            hits = [{k: v for k, v in x.items() if k != "path"} for x in _scan_file(path, content, kind)]
+            shared.set(key, hits, BLOB_CACHE_TTL)
+        findings.extend({"scanner": x["scanner"], "path": path, **x} for x in hits)
     return findings
@@ -0,0 +1,87 @@
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import sys
+
+import httpx
+
+# GitHub truncates push payloads to this many commits; at the cap we ask the compare API instead.
+PAYLOAD_COMMIT_LIMIT = 20
+REPORT_COMMIT_MESSAGE = "VibeSec: security report"
+
+
+def sign(body: bytes, secret: str) -> str:
+    return "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(body: bytes, signature: str, secret: str) -> bool:
+    if not secret or not signature:
+        return False
+    return hmac.compare_digest(sign(body, secret), signature)
+
+
+def changed_paths(payload: dict) -> tuple[set[str], bool]:
+    # Replays commits in order so a path added then removed in the same push is dropped.
+    paths = set()
+    commits = payload.get("commits") or []
+    for c in commits:
+        for p in (c.get("added") or []) + (c.get("modified") or []):
+            paths.add(p)
+        for p in c.get("removed") or []:
+            paths.discard(p)
+    return paths, len(commits) >= PAYLOAD_COMMIT_LIMIT
+
+
+def skip_reason(payload: dict) -> str | None:
+    if payload.get("deleted"):
+        return "ref_deleted"
+    if not (payload.get("ref") or "").startswith("refs/heads/"):
+        return "not_a_branch"
+    head = payload.get("head_commit") or {}
+    if (head.get("message") or "").startswith(REPORT_COMMIT_MESSAGE):
+        return "own_report_commit"
+    return None
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m api.webhook",
+        description="Replay a recorded GitHub push payload against a VibeSec server.",
+    )
+    parser.add_argument("payload", help="path to a recorded push event JSON body")
+    parser.add_argument("--url", default="http://localhost:8000/webhook")
+    parser.add_argument("--secret", default=os.environ.get("GITHUB_WEBHOOK_SECRET", ""))
+    parser.add_argument("--dry-run", action="store_true", help="print the changed paths instead of posting")
+    args = parser.parse_args(argv)
+
+    with open(args.payload, "rb") as f:
+        body = f.read()
+    if args.dry_run:
+        payload = json.loads(body)
+        paths, truncated = changed_paths(payload)
+        print(json.dumps({
+            "repo": (payload.get("repository") or {}).get("full_name"),
+            "after": payload.get("after"),
+            "skip": skip_reason(payload),
+            "truncated": truncated,
+            "paths": sorted(paths),
+        }, indent=2))
+        return 0
+    r = httpx.post(
+        args.url,
+        content=body,
+        headers={
+            "Content-Type": "application/json",
+            "X-GitHub-Event": "push",
+            "X-Hub-Signature-256": sign(body, args.secret),
+        },
+        timeout=30.0,
+    )
+    print(r.status_code, r.text)
+    return 0 if r.is_success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
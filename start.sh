@@ -1,3 +1,4 @@
 #!/bin/sh
 port="${PORT:-8000}"
-exec uvicorn api.main:app --host 0.0.0.0 --port "$port"
+workers="${WEB_CONCURRENCY:-1}"
+exec uvicorn api.main:app --host 0.0.0.0 --port "$port" --workers "$workers"